@@ -0,0 +1,356 @@
+"""
+This module contains the BatchScorer class responsible for scoring many users' answers at once.
+
+Every selectable answer of the question bank is mapped to a column ("slot") of a selection matrix
+and every (dimension, category, subcategory) score to a column ("bucket") of the result matrix.
+Scores of a whole cohort are then computed with a single matrix product per chunk of users:
+
+    scores = selections @ weights
+
+where `weights[slot, bucket]` holds the score (or `negative_score` for wrong list-matching pairs)
+the slot contributes to the bucket. Answers to open questions have no slots: they are rated in one batch
+for the whole cohort and their score rows are added to the result matrix afterwards.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from open_answers import OpenAnswerRater, get_open_answer_rater
+from question_bank import QuestionBank
+from utils import group_answers_by_user
+
+Bucket = Tuple[str, str, Optional[str]]
+
+
+class BatchScores:
+    """
+    Scores of many users in a dense form.
+
+    Attributes:
+        user_ids (List[int]): IDs of the scored users, one per row.
+        buckets (List[Bucket]): (dimension, category, subcategory) of each column,
+            subcategory is None for category totals.
+        scores (np.ndarray): Users x buckets matrix of scores.
+        touched (np.ndarray): Users x buckets boolean matrix, True where at least one score was added.
+        integral (np.ndarray): True where scores are integers, either per bucket or users x buckets.
+    """
+    __slots__ = ('user_ids', 'buckets', 'scores', 'touched', 'integral')
+
+    def __init__(self, user_ids: List[int], buckets: List[Bucket], scores: np.ndarray, touched: np.ndarray,
+                 integral: np.ndarray):
+        """Initialize a BatchScores object."""
+        self.user_ids = user_ids
+        self.buckets = buckets
+        self.scores = scores
+        self.touched = touched
+        self.integral = integral
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def from_dicts(cls, results: Dict[int, Dict]) -> 'BatchScores':
+        """Load nested score dictionaries keyed by user ID into the dense form."""
+        buckets, bucket_index, cells = [], {}, []
+        for row, total_scores in enumerate(results.values()):
+            for dimension, categories in total_scores.items():
+                for category, subcategories in categories.items():
+                    for subcategory, score in subcategories.items():
+                        key = (dimension, category, None if subcategory == 'total' else subcategory)
+                        if key not in bucket_index:
+                            bucket_index[key] = len(buckets)
+                            buckets.append(key)
+                        cells.append((row, bucket_index[key], score))
+        scores = np.zeros((len(results), len(buckets)), dtype=np.float64)
+        touched = np.zeros((len(results), len(buckets)), dtype=bool)
+        integral = np.ones((len(results), len(buckets)), dtype=bool)
+        for row, column, score in cells:
+            scores[row, column] = score
+            touched[row, column] = True
+            integral[row, column] = isinstance(score, int)
+        return cls(list(results), buckets, scores, touched, integral)
+
+    def total_scores(self, row: int) -> Dict:
+        """Build the nested score dictionary of a single user, as returned by `ProfilingTestScoring`."""
+        total_scores = {}
+        scores = self.scores[row]
+        integral = self.integral[row] if self.integral.ndim == 2 else self.integral
+        for column in np.flatnonzero(self.touched[row]):
+            dimension, category, subcategory = self.buckets[column]
+            score = int(scores[column]) if integral[column] else float(scores[column])
+            categories = total_scores.setdefault(dimension, {})
+            categories.setdefault(category, {})[subcategory or 'total'] = score
+        return total_scores
+
+    def to_dicts(self) -> Dict[int, Dict]:
+        """Build the nested score dictionaries of all users keyed by user ID."""
+        return {user_id: self.total_scores(row) for row, user_id in enumerate(self.user_ids)}
+
+
+class BatchScorer:
+    """
+    A vectorized scorer for a cohort of users sharing one question bank.
+
+    Results are equal to running `ProfilingTestScoring.calculate_scores_for_profiling_test` per user.
+    Integer scores are reproduced exactly; float scores may differ by rounding of the summation order.
+
+    Attributes:
+        question_bank (QuestionBank): Compiled questions to score against.
+        buckets (List[Bucket]): (dimension, category, subcategory) of each score column.
+        weights (np.ndarray): Slots x buckets matrix of scores.
+        hits (np.ndarray): Slots x buckets matrix of the number of scores each slot adds to a bucket.
+        integral (np.ndarray): Boolean flag per bucket, True if all its weights are integers.
+        chunk_size (int): Number of users scored per matrix product, bounds the memory used.
+        open_rater (OpenAnswerRater): Rater of answers to open questions, defaults to the shared rater of the
+            question bank.
+    """
+
+    def __init__(self, question_bank: QuestionBank, chunk_size: int = 4096,
+                 open_rater: Optional[OpenAnswerRater] = None):
+        """Build the slot and bucket indices and the weight matrices of a question bank."""
+        self.question_bank = question_bank
+        self.chunk_size = chunk_size
+        self._open_rater = open_rater
+        self.buckets = []
+        bucket_index = {}
+        # Per question position: (question type, slot per option index) for single and multiple questions,
+        # (question type, {option value: slot per selected option index}) for list-matching questions
+        self._question_slots = []
+        entries = []  # (slot, bucket, weight)
+
+        def add_rows(slot, rows, is_correct):
+            for dimension, category, subcategory, score, negative_score in rows:
+                weight = score if is_correct else negative_score
+                # Mirror the `ProfilingTestScoring.process_score` guard
+                if not all([dimension, category, weight]):
+                    continue
+                key = (dimension, category, subcategory if subcategory and subcategory != 'total' else None)
+                if key not in bucket_index:
+                    bucket_index[key] = len(self.buckets)
+                    self.buckets.append(key)
+                if slot is not None:
+                    entries.append((slot, bucket_index[key], weight))
+
+        num_slots = 0
+        for question in question_bank.compiled:
+            if question.question_type in ['single', 'multiple']:
+                option_slots = tuple(range(num_slots, num_slots + len(question.option_rows)))
+                for slot, rows in zip(option_slots, question.option_rows):
+                    add_rows(slot, rows, True)
+                num_slots += len(option_slots)
+                self._question_slots.append((question.question_type, option_slots))
+            elif question.question_type == 'list-matching':
+                matching_slots = {}
+                for option_value, (rows, correct_value) in question.matching.items():
+                    add_rows(num_slots, rows, True)
+                    add_rows(num_slots + 1, rows, False)
+                    matching_slots[option_value] = tuple(
+                        num_slots if correct_value is not None and value == correct_value else num_slots + 1
+                        for value in question.options)
+                    num_slots += 2
+                self._question_slots.append((question.question_type, matching_slots))
+            elif question.question_type == 'open':
+                # Only the buckets of the keyword rules, so that their columns do not depend on the answers
+                for _, rows in question.keyword_rows:
+                    add_rows(None, rows, True)
+                self._question_slots.append((question.question_type, None))
+            else:
+                self._question_slots.append((question.question_type, None))
+
+        self.num_slots = num_slots
+        self.weights = np.zeros((num_slots, len(self.buckets)), dtype=np.float64)
+        self.hits = np.zeros((num_slots, len(self.buckets)), dtype=np.float64)
+        self.integral = np.ones(len(self.buckets), dtype=bool)
+        for slot, bucket, weight in entries:
+            self.weights[slot, bucket] += weight
+            self.hits[slot, bucket] += 1
+            if not isinstance(weight, int):
+                self.integral[bucket] = False
+
+    @property
+    def open_rater(self) -> OpenAnswerRater:
+        """The rater of open answers, created on first use."""
+        if self._open_rater is None:
+            self._open_rater = get_open_answer_rater(self.question_bank)
+        return self._open_rater
+
+    def select_slots(self, user_answers: List[Dict], open_answers: Optional[List[Dict]] = None) -> List[int]:
+        """Map a user's answers to the list of selected slots, collecting answers to open questions."""
+        question_index = self.question_bank.index
+        question_slots = self._question_slots
+        slots = []
+        for answer in user_answers:
+            position = question_index.get(answer['question_id'])
+            if position is None:
+                raise ValueError(f'Question `{answer["question_id"]}` is not in the questions table.')
+            question_type, option_slots = question_slots[position]
+            if question_type in ['multiple', 'single']:
+                selected_options = answer['answer'].get('selected')
+                if isinstance(selected_options, list):
+                    slots.extend([option_slots[option_index] for option_index in selected_options])
+                elif isinstance(selected_options, int):
+                    slots.append(option_slots[selected_options])
+            elif question_type == 'open':
+                if open_answers is not None:
+                    open_answers.append(answer)
+            elif question_type == 'list-matching':
+                for option_value, selected_index in answer['answer']['selected'].items():
+                    pair_slots = option_slots.get(option_value)
+                    if pair_slots is not None:
+                        slots.append(pair_slots[selected_index])
+        return slots
+
+    def selection_matrix(self, users_answers: List[List[Dict]],
+                         open_answers: Optional[List[Tuple[int, Dict]]] = None) -> np.ndarray:
+        """Build the users x slots matrix of selection counts, collecting (row, answer) of open answers."""
+        rows, columns, user_open_answers = [], [], []
+        for row, user_answers in enumerate(users_answers):
+            slots = self.select_slots(user_answers, user_open_answers)
+            rows.extend([row] * len(slots))
+            columns.extend(slots)
+            if user_open_answers:
+                if open_answers is not None:
+                    open_answers.extend((row, answer) for answer in user_open_answers)
+                user_open_answers.clear()
+        flat_index = np.asarray(rows, dtype=np.int64) * self.num_slots + np.asarray(columns, dtype=np.int64)
+        counts = np.bincount(flat_index, minlength=len(users_answers) * self.num_slots)
+        return counts.reshape(len(users_answers), self.num_slots).astype(np.float64)
+
+    def score_users(self, users_answers: Dict[int, List[Dict]]) -> BatchScores:
+        """Score answers already grouped by user ID."""
+        user_ids = list(users_answers)
+        grouped_answers = list(users_answers.values())
+        scores = np.zeros((len(user_ids), len(self.buckets)), dtype=np.float64)
+        touched = np.zeros((len(user_ids), len(self.buckets)), dtype=bool)
+        open_answers = []
+        for start in range(0, len(user_ids), self.chunk_size):
+            chunk_open_answers = []
+            selections = self.selection_matrix(grouped_answers[start:start + self.chunk_size], chunk_open_answers)
+            scores[start:start + len(selections)] = selections @ self.weights
+            touched[start:start + len(selections)] = (selections @ self.hits) > 0
+            open_answers.extend((start + row, answer) for row, answer in chunk_open_answers)
+        batch_scores = BatchScores(user_ids, list(self.buckets), scores, touched, self.integral.copy())
+        if open_answers:
+            self.add_open_answer_scores(batch_scores, open_answers)
+        return batch_scores
+
+    def add_open_answer_scores(self, batch_scores: BatchScores, open_answers: List[Tuple[int, Dict]]):
+        """
+        Rate open answers in one batch and add their scores to the rows of their users.
+
+        Buckets the rater scores that are not in the keyword rules of the question bank are appended as new columns.
+        """
+        buckets = batch_scores.buckets
+        bucket_index = {bucket: column for column, bucket in enumerate(buckets)}
+        integral = list(batch_scores.integral)
+        rows, columns, weights = [], [], []
+        rated = self.open_rater.rate([answer for _, answer in open_answers])
+        for (row, _), score_rows in zip(open_answers, rated):
+            for dimension, category, subcategory, score, _ in score_rows:
+                # Mirror the `ProfilingTestScoring.process_score` guard
+                if not all([dimension, category, score]):
+                    continue
+                key = (dimension, category, subcategory if subcategory and subcategory != 'total' else None)
+                column = bucket_index.get(key)
+                if column is None:
+                    column = bucket_index[key] = len(buckets)
+                    buckets.append(key)
+                    integral.append(True)
+                if not isinstance(score, int):
+                    integral[column] = False
+                rows.append(row)
+                columns.append(column)
+                weights.append(score)
+
+        num_new_buckets = len(buckets) - batch_scores.scores.shape[1]
+        if num_new_buckets:
+            padding = ((0, 0), (0, num_new_buckets))
+            batch_scores.scores = np.pad(batch_scores.scores, padding)
+            batch_scores.touched = np.pad(batch_scores.touched, padding)
+        cells = (np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64))
+        np.add.at(batch_scores.scores, cells, np.asarray(weights, dtype=np.float64))
+        batch_scores.touched[cells] = True
+        batch_scores.integral = np.asarray(integral, dtype=bool)
+
+    def score(self, answers_table: List[Dict]) -> BatchScores:
+        """Score an answers table holding the answers of many users."""
+        return self.score_users(group_answers_by_user(answers_table))
+
+
+def adjust_batch_scores(batch_scores: BatchScores) -> BatchScores:
+    """
+    Scale subcategory scores of many users so that they add up to the total score of their category.
+
+    This is the vectorized counterpart of `score.adjust_subcategory_scores`. A new BatchScores object
+    is returned, `batch_scores` is left unchanged. Totals may differ from the per-user function
+    by rounding of the summation order.
+    """
+    buckets = list(batch_scores.buckets)
+    categories, category_index, total_columns = [], {}, {}
+    for column, (dimension, category, subcategory) in enumerate(buckets):
+        if (dimension, category) not in category_index:
+            category_index[(dimension, category)] = len(categories)
+            categories.append((dimension, category))
+        if subcategory is None:
+            total_columns[(dimension, category)] = column
+    # Every category gets a total score after the adjustment
+    for dimension, category in categories:
+        if (dimension, category) not in total_columns:
+            total_columns[(dimension, category)] = len(buckets)
+            buckets.append((dimension, category, None))
+
+    num_users, num_raw_buckets = batch_scores.scores.shape
+    scores = np.zeros((num_users, len(buckets)), dtype=np.float64)
+    touched = np.zeros((num_users, len(buckets)), dtype=bool)
+    integral = np.ones((num_users, len(buckets)), dtype=bool)
+    scores[:, :num_raw_buckets] = np.where(batch_scores.touched, batch_scores.scores, 0)
+    touched[:, :num_raw_buckets] = batch_scores.touched
+    integral[:, :num_raw_buckets] = batch_scores.integral
+
+    # Buckets x categories membership of subcategory scores, categories x dimensions membership
+    dimensions = list(dict.fromkeys(dimension for dimension, _ in categories))
+    subcategory_membership = np.zeros((len(buckets), len(categories)), dtype=np.float64)
+    for column, (dimension, category, subcategory) in enumerate(buckets):
+        if subcategory is not None:
+            subcategory_membership[column, category_index[(dimension, category)]] = 1
+    dimension_membership = np.zeros((len(categories), len(dimensions)), dtype=np.int64)
+    for position, (dimension, _) in enumerate(categories):
+        dimension_membership[position, dimensions.index(dimension)] = 1
+    category_totals = np.array([total_columns[key] for key in categories], dtype=np.int64)
+
+    subcategories_sum = scores @ subcategory_membership
+    num_subcats = touched.astype(np.float64) @ subcategory_membership
+    has_total = touched[:, category_totals]
+    totals = np.where(has_total, scores[:, category_totals], subcategories_sum)
+    exists = has_total | (num_subcats > 0)
+
+    # Check if either all categories have the 'total' key or none of them have it
+    total_keys_count = has_total.astype(np.int64) @ dimension_membership
+    categories_count = exists.astype(np.int64) @ dimension_membership
+    inconsistent = (total_keys_count != 0) & (total_keys_count != categories_count)
+    if inconsistent.any():
+        row, dimension_position = np.argwhere(inconsistent)[0]
+        raise ValueError(
+            (f'Inconsistent \'total\' keys in categories for dimension `{dimensions[dimension_position]}` '
+             f'of user `{batch_scores.user_ids[row]}`. '
+             'Either all categories should have the \'total\' key or none of them should.'))
+
+    # Scale subcategories if their sum is not zero, otherwise distribute the total equally among them
+    nonzero_sum = subcategories_sum != 0
+    factor = np.divide(totals, subcategories_sum, out=np.zeros_like(totals), where=nonzero_sum)
+    equal_val = np.divide(np.where(totals != 0, totals, num_subcats), num_subcats,
+                          out=np.zeros_like(totals), where=num_subcats > 0)
+    bucket_category = subcategory_membership.argmax(axis=1)
+    is_subcategory = subcategory_membership.any(axis=1)
+    adjusted_subcategories = np.where(nonzero_sum[:, bucket_category],
+                                      scores * factor[:, bucket_category],
+                                      equal_val[:, bucket_category])
+    adjusted_subcategories = np.where(touched & is_subcategory, adjusted_subcategories, 0)
+    adjusted = np.where(is_subcategory, adjusted_subcategories, scores)
+    adjusted[:, category_totals] = np.where(num_subcats > 0, adjusted_subcategories @ subcategory_membership,
+                                            totals)
+
+    touched[:, category_totals] = exists
+    integral[:, is_subcategory] = False
+    integral[:, category_totals] &= num_subcats == 0
+    return BatchScores(list(batch_scores.user_ids), buckets, adjusted, touched, integral)
@@ -0,0 +1,5 @@
+"""
+Benchmarks of the profiling test pipeline on synthetic question banks and cohorts.
+
+Run a benchmark as a module from the project root, e.g. `python -m benchmarks.batch_scoring`.
+"""
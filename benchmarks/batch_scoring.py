@@ -0,0 +1,57 @@
+"""
+Benchmark of `BatchScorer` and `adjust_batch_scores` against scoring and adjusting every user separately.
+
+Usage:
+    python -m benchmarks.batch_scoring [num_users]
+"""
+import sys
+import time
+
+from batch_score import BatchScorer, adjust_batch_scores
+from benchmarks.synthetic import generate_answers, generate_questions
+from question_bank import QuestionBank
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from utils import group_answers_by_user
+
+
+def run(num_users: int = 10000, num_questions: int = 75):
+    """Score a synthetic cohort both ways, check the results match and print the timings."""
+    questions = generate_questions(num_questions=num_questions)
+    answers_table = generate_answers(questions, num_users=num_users)
+    question_bank = QuestionBank(questions)
+
+    start = time.perf_counter()
+    serial_results = {
+        user_id: ProfilingTestScoring(user_id, questions, user_answers, question_bank)
+        .calculate_scores_for_profiling_test()
+        for user_id, user_answers in group_answers_by_user(answers_table).items()
+    }
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_scores = BatchScorer(question_bank).score(answers_table)
+    batch_time = time.perf_counter() - start
+    batch_results = batch_scores.to_dicts()
+    to_dicts_time = time.perf_counter() - start - batch_time
+
+    assert batch_results == serial_results, 'Batch results differ from the per-user scorer.'
+    print(f'{num_users} users x {num_questions} questions ({len(answers_table)} answers)')
+    print(f'per-user loop:     {serial_time:8.3f} s')
+    print(f'batch (dense):     {batch_time:8.3f} s  speedup x{serial_time / batch_time:.1f}')
+    print(f'batch (+ dicts):   {batch_time + to_dicts_time:8.3f} s  '
+          f'speedup x{serial_time / (batch_time + to_dicts_time):.1f}')
+
+    start = time.perf_counter()
+    for result_scores in serial_results.values():
+        adjust_subcategory_scores(result_scores)
+    serial_adjust_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    adjust_batch_scores(batch_scores)
+    batch_adjust_time = time.perf_counter() - start
+    print(f'per-user adjust:   {serial_adjust_time:8.3f} s')
+    print(f'batch adjust:      {batch_adjust_time:8.3f} s  speedup x{serial_adjust_time / batch_adjust_time:.1f}')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,69 @@
+"""
+Benchmark of cohort analytics: loading results into `CohortScores` and summarizing them, against computing
+the same percentiles by scanning the nested result dictionaries.
+
+Usage:
+    python -m benchmarks.cohort_analytics [num_users]
+"""
+import sys
+import time
+
+import numpy as np
+
+from batch_score import BatchScorer, adjust_batch_scores
+from benchmarks.synthetic import generate_answers, generate_questions
+from cohort import CohortScores
+from question_bank import QuestionBank
+from utils import group_answers_by_user
+
+
+def scan_percentiles(results, buckets, q=50):
+    """Compute a percentile per bucket by scanning the nested result dictionaries."""
+    percentiles = {}
+    for dimension, category, subcategory in buckets:
+        values = [results_of_user.get(dimension, {}).get(category, {}).get(subcategory or 'total', 0)
+                  for results_of_user in results.values()]
+        percentiles[(dimension, category, subcategory)] = np.percentile(values, q)
+    return percentiles
+
+
+def run(num_users: int = 20000, num_questions: int = 200, seed: int = 0):
+    """Load and summarize a synthetic cohort of adjusted scores."""
+    questions = generate_questions(num_questions=num_questions, seed=seed, category_level_ratio=0.2)
+    question_bank = QuestionBank(questions)
+    batch_scores = adjust_batch_scores(
+        BatchScorer(question_bank).score_users(group_answers_by_user(generate_answers(questions, num_users, seed))))
+    results = batch_scores.to_dicts()
+    cohort = CohortScores.from_question_bank(question_bank)
+    print(f'{num_users} users x {len(cohort.buckets)} buckets')
+
+    start = time.perf_counter()
+    scan_percentiles(results, cohort.buckets)
+    print(f'{"scan dicts, one percentile":32s} {time.perf_counter() - start:8.3f} s')
+
+    start = time.perf_counter()
+    cohort.add_many(results)
+    print(f'{"load dicts":32s} {time.perf_counter() - start:8.3f} s')
+
+    cohort = CohortScores.from_question_bank(question_bank)
+    start = time.perf_counter()
+    cohort.add_batch(batch_scores)
+    print(f'{"load batch scores":32s} {time.perf_counter() - start:8.3f} s')
+
+    start = time.perf_counter()
+    summary = cohort.summary()
+    print(f'{"summary, 101 percentiles + hist":32s} {time.perf_counter() - start:8.3f} s')
+
+    new_results = dict(list(results.items())[:100])
+    start = time.perf_counter()
+    cohort.add_many({user_id + num_users: scores for user_id, scores in new_results.items()})
+    print(f'{"add 100 users":32s} {(time.perf_counter() - start) * 1000:8.3f} ms')
+
+    user_scores = results[cohort.user_ids[0]]
+    start = time.perf_counter()
+    summary.percentile_ranks(user_scores)
+    print(f'{"rank a user from the summary":32s} {(time.perf_counter() - start) * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
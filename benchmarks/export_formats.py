@@ -0,0 +1,63 @@
+"""
+Benchmark of the JSON and binary formats of `export_results`.
+
+Usage:
+    python -m benchmarks.export_formats [num_answers]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+from binary_export import BinaryExport
+from benchmarks.synthetic import generate_answers, generate_questions
+from utils import export_results
+
+
+def folder_size(path: str) -> int:
+    """Total size in bytes of the files in a folder."""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def run(num_answers: int = 100000, num_questions: int = 100):
+    """Export and load a synthetic answers table in both formats and print times and sizes."""
+    questions = generate_questions(num_questions=num_questions)
+    answers_table = generate_answers(questions, num_users=-(-num_answers // num_questions))[:num_answers]
+    # Answers exported by the questionnaire embed the scoring details of their question
+    scoring_details = {question['id']: question['scoring_details'] for question in questions}
+    for answer in answers_table:
+        answer['answer']['scoring_details (FOR DEBUG ONLY)'] = scoring_details[answer['question_id']]
+    result_scores = {'dimension': {'category': {'total': 1}}}
+
+    with tempfile.TemporaryDirectory() as export_dir:
+        start = time.perf_counter()
+        export_results(questions, answers_table, result_scores, result_scores, export_dir=export_dir)
+        json_export_time = time.perf_counter() - start
+        json_size = folder_size(export_dir)
+        start = time.perf_counter()
+        with open(os.path.join(export_dir, 'answers_table.json'), 'r', encoding='utf-8') as fh:
+            json.load(fh)
+        json_load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        export_results(questions, answers_table, result_scores, result_scores, export_dir=export_dir,
+                       export_format='binary')
+        binary_export_time = time.perf_counter() - start
+        binary_size = folder_size(os.path.join(export_dir, 'binary'))
+        start = time.perf_counter()
+        binary_export = BinaryExport(os.path.join(export_dir, 'binary'))
+        binary_mmap_time = time.perf_counter() - start
+        start = time.perf_counter()
+        binary_answers = binary_export.answers_table()
+        binary_load_time = time.perf_counter() - start
+        assert [a['answer']['selected'] for a in binary_answers] == [a['answer']['selected'] for a in answers_table]
+
+    print(f'{len(answers_table)} answers, {num_questions} questions')
+    print(f'json:    export {json_export_time:7.3f} s  load {json_load_time:7.3f} s  size {json_size / 2 ** 20:8.2f} MiB')
+    print(f'binary:  export {binary_export_time:7.3f} s  load {binary_load_time:7.3f} s  size '
+          f'{binary_size / 2 ** 20:8.2f} MiB  (memory-map {binary_mmap_time:.4f} s)')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
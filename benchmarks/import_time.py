@@ -0,0 +1,43 @@
+"""
+Benchmark of the import time of the scoring path.
+
+Every module is imported in a fresh interpreter, reporting the wall time of the import and whether it pulled in
+Streamlit, Plotly or NumPy.
+
+Usage:
+    python -m benchmarks.import_time [repeats]
+"""
+import json
+import subprocess
+import sys
+
+MODULES = ['score', 'scoring_service', 'scoring_server', 'result_cache', 'stream_scores', 'batch_score', 'visualize']
+HEAVY_MODULES = ['streamlit', 'plotly', 'numpy']
+
+MEASURE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+
+def measure_import(module: str) -> dict:
+    """Import a module in a fresh interpreter and return its import time and the heavy modules it loaded."""
+    output = subprocess.run([sys.executable, '-c', MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def run(repeats: int = 5):
+    """Print the best import time of every module of the scoring path."""
+    for module in MODULES:
+        results = [measure_import(module) for _ in range(repeats)]
+        best_time = min(result['seconds'] for result in results)
+        heavy = ', '.join(results[0]['heavy']) or '-'
+        print(f'{module:16s} {best_time * 1000:8.1f} ms  imports {heavy}')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,131 @@
+"""
+Benchmark of eager question loading against manifest-based lazy loading.
+
+Every mode runs in a fresh process, reporting the time to get a single question (or one dimension)
+and the peak RSS of the process. The questionnaire modes replay the first render of the app, with and
+without a filter, and fail the benchmark if it parses more than one question file.
+
+Usage:
+    python -m benchmarks.lazy_loading [num_questions]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MODES = {
+    'eager': 'load_and_merge_questions, then question N',
+    'lazy (cold manifest)': 'build the manifest, then question N',
+    'lazy (warm manifest)': 'read the manifest, then question N',
+    'lazy (one dimension)': 'read the manifest, then every question of one dimension',
+    'questionnaire': 'first render: answer and score the first question',
+    'questionnaire (filtered)': 'first render with `?filter=dimension:dimension 0`',
+}
+FIRST_RENDER_MODES = {'questionnaire': None, 'questionnaire (filtered)': ['dimension:dimension 0']}
+
+
+def peak_rss_mib() -> float:
+    """Peak RSS of the current process in MiB."""
+    # ru_maxrss survives exec on Linux and may report the parent's peak, VmHWM does not
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2 ** 20 if sys.platform == 'darwin' else maxrss / 1024
+
+
+def first_render(questions_dir: str, filters=None) -> int:
+    """Replay the calls of the questionnaire's first render and return the number of question files parsed."""
+    from manifest import load_lazy_questions
+    from question_bank import get_shared_question_bank
+    from score import IncrementalProfilingTestScoring
+    from session_answers import SessionAnswers
+
+    questions = load_lazy_questions(questions_dir, filters)
+    question_bank = get_shared_question_bank(questions)
+    session_answers = SessionAnswers(question_bank)
+    scorer = IncrementalProfilingTestScoring(user_id=123, questions=questions, question_bank=question_bank)
+    question = questions[0]
+    options = question.get('answer_structure', {}).get('options', [])
+    selected = {'single': 0, 'multiple': [0], 'list-matching': {option: 0 for option in options},
+                'open': 'first answer'}[question['question_type']]
+    session_answers.set(question['id'], selected)
+    scorer.update_answer(session_answers.answer(question['id'], user_id=123))
+    return questions.loaded_files
+
+
+def measure_mode(mode: str, questions_dir: str) -> dict:
+    """Run a loading mode in the current process and return its time and peak RSS."""
+    baseline_rss = peak_rss_mib()
+    start = time.perf_counter()
+    loaded_files = None
+    if mode == 'eager':
+        from utils import load_and_merge_questions
+        questions = load_and_merge_questions(questions_dir)
+        questions[len(questions) // 2]
+    elif mode in FIRST_RENDER_MODES:
+        from manifest import load_manifest
+        load_manifest(questions_dir)
+        start = time.perf_counter()
+        loaded_files = first_render(questions_dir, FIRST_RENDER_MODES[mode])
+    else:
+        from manifest import MANIFEST_FILE_NAME, LazyQuestions
+        if mode == 'lazy (cold manifest)':
+            (Path(questions_dir) / MANIFEST_FILE_NAME).unlink(missing_ok=True)
+        questions = LazyQuestions(questions_dir)
+        if mode == 'lazy (one dimension)':
+            questions.select(dimensions=['dimension 0'])
+        else:
+            questions[len(questions) // 2]
+        loaded_files = questions.loaded_files
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'peak_rss_mib': peak_rss_mib(), 'rss_growth_mib': peak_rss_mib() - baseline_rss,
+            'loaded_files': loaded_files}
+
+
+def run(num_questions: int = 20000, num_dimensions: int = 50):
+    """Write a synthetic bank and measure every loading mode in a fresh process."""
+    from benchmarks.synthetic import generate_questions, write_question_bank
+
+    questions = generate_questions(num_dimensions=num_dimensions, num_categories=20, num_subcategories=20,
+                                   num_questions=num_questions, num_options=6)
+    with tempfile.TemporaryDirectory() as questions_dir:
+        write_question_bank(questions, questions_dir)
+        print(f'{num_questions} questions in {num_dimensions} dimensions')
+        failures = []
+        for mode, description in MODES.items():
+            output = subprocess.run([sys.executable, '-m', 'benchmarks.lazy_loading', '--mode', mode,
+                                     '--questions-dir', questions_dir],
+                                    check=True, capture_output=True, text=True).stdout
+            result = json.loads(output)
+            print(f'{mode:24s} {result["seconds"] * 1000:9.1f} ms  peak RSS {result["peak_rss_mib"]:7.1f} MiB '
+                  f'(+{result["rss_growth_mib"]:6.1f} MiB)  {description}')
+            if mode in FIRST_RENDER_MODES and result['loaded_files'] != 1:
+                failures.append(f'{mode}: parsed {result["loaded_files"]} question files, expected 1')
+        if failures:
+            raise SystemExit('\n'.join(failures))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark eager and lazy question loading.')
+    parser.add_argument('num_questions', type=int, nargs='?', default=20000)
+    parser.add_argument('--mode', choices=list(MODES), help='Measure a single mode in this process.')
+    parser.add_argument('--questions-dir')
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(measure_mode(args.mode, args.questions_dir)))
+    else:
+        run(args.num_questions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark of rating open answers: the keyword automata of `KeywordRater` against scanning every answer for
+every keyword of its question, and scoring a cohort with open answers through `BatchScorer`.
+
+Usage:
+    python -m benchmarks.open_answers [num_answers]
+"""
+import sys
+import time
+
+from batch_score import BatchScorer
+from benchmarks.synthetic import generate_answers, generate_open_questions, generate_questions
+from open_answers import KeywordRater
+from question_bank import QuestionBank
+from utils import group_answers_by_user
+
+
+def scan_keywords(question_bank, answers):
+    """Rate open answers by searching every keyword of their question in the text, as a substring."""
+    results = []
+    for answer in answers:
+        question = question_bank.get_compiled(answer['question_id'])
+        text = answer['answer']['selected'].casefold()
+        results.append(tuple(row for keyword, rows in question.keyword_rows if keyword.casefold() in text
+                             for row in rows))
+    return results
+
+
+def run(num_answers: int = 100000, num_open_questions: int = 50, seed: int = 0):
+    """Rate synthetic sets of open answers and score a cohort with open questions."""
+    num_users = -(-num_answers // num_open_questions)
+    for num_keywords in [30, 300]:
+        open_questions = generate_open_questions(num_open_questions, num_keywords, seed=seed)
+        answers = generate_answers(open_questions, num_users, seed)[:num_answers]
+        question_bank = QuestionBank(open_questions)
+        print(f'{len(answers)} open answers, {num_open_questions} questions x {num_keywords} keywords')
+
+        start = time.perf_counter()
+        scan_keywords(question_bank, answers)
+        print(f'{"substring scan":32s} {time.perf_counter() - start:8.3f} s')
+
+        # Including the automata, built on first use
+        start = time.perf_counter()
+        KeywordRater(question_bank).rate(answers)
+        print(f'{"keyword rater, one batch":32s} {time.perf_counter() - start:8.3f} s')
+
+    questions = generate_questions(num_questions=200, seed=seed) + generate_open_questions(
+        num_open_questions, 30, first_id=201, seed=seed)
+    users_answers = group_answers_by_user(generate_answers(questions, num_users, seed))
+    scorer = BatchScorer(QuestionBank(questions))
+    start = time.perf_counter()
+    scorer.score_users(users_answers)
+    print(f'{"batch score, 200 + 50 open":32s} {time.perf_counter() - start:8.3f} s ({num_users} users)')
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,37 @@
+"""
+Scaling benchmark of `score_parallel` across worker counts.
+
+Usage:
+    python -m benchmarks.parallel_scoring [num_users]
+"""
+import os
+import sys
+import time
+
+from benchmarks.synthetic import generate_answers, generate_questions
+from parallel_score import score_parallel, score_serial
+from question_bank import QuestionBank
+
+
+def run(num_users: int = 20000, num_questions: int = 75, worker_counts=(1, 2, 4, 8)):
+    """Score a synthetic cohort with increasing worker counts, check the results match and print the timings."""
+    questions = generate_questions(num_questions=num_questions)
+    answers_table = generate_answers(questions, num_users=num_users)
+    question_bank = QuestionBank(questions)
+
+    start = time.perf_counter()
+    serial_results = score_serial(answers_table, question_bank)
+    serial_time = time.perf_counter() - start
+    print(f'{num_users} users x {num_questions} questions on {os.cpu_count()} CPUs')
+    print(f'serial:     {serial_time:8.3f} s')
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        results = score_parallel(answers_table, question_bank, workers=workers)
+        elapsed = time.perf_counter() - start
+        assert list(results.items()) == list(serial_results.items()), 'Parallel results differ from the serial path.'
+        print(f'{workers} workers:  {elapsed:8.3f} s  speedup x{serial_time / elapsed:.1f}')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
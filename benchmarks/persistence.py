@@ -0,0 +1,71 @@
+"""
+Benchmark of saving submissions through `AnswerStore`.
+
+Concurrent threads submit answer sheets and results, as Streamlit sessions do, measuring the latency
+of a submission to the caller and the throughput until everything is committed.
+
+Usage:
+    python -m benchmarks.persistence [num_submissions]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import generate_answers, generate_questions
+from persistence import AnswerStore
+from question_bank import QuestionBank
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from utils import group_answers_by_user
+
+
+def run(num_submissions: int = 5000, num_threads: int = 16, num_questions: int = 75):
+    """Submit a synthetic cohort from concurrent threads and print latency and throughput."""
+    questions = generate_questions(num_questions=num_questions)
+    question_bank = QuestionBank(questions)
+    submissions = []
+    for user_id, user_answers in group_answers_by_user(generate_answers(questions, num_users=num_submissions)).items():
+        result_scores = ProfilingTestScoring(user_id, questions, user_answers, question_bank) \
+            .calculate_scores_for_profiling_test()
+        submissions.append((user_id, user_answers, result_scores, adjust_subcategory_scores(result_scores)))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = AnswerStore(os.path.join(work_dir, 'bench.sqlite3'))
+        latencies = []
+        latencies_lock = threading.Lock()
+
+        def submit(thread_submissions):
+            thread_latencies = []
+            for user_id, user_answers, result_scores, adjusted_scores in thread_submissions:
+                start = time.perf_counter()
+                store.save_answers(user_answers)
+                store.save_results(user_id, 0, result_scores, adjusted_scores)
+                thread_latencies.append(time.perf_counter() - start)
+            with latencies_lock:
+                latencies.extend(thread_latencies)
+
+        threads = [threading.Thread(target=submit, args=(submissions[i::num_threads],)) for i in range(num_threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store.flush()
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        num_answers = sum(1 for _ in store.iter_answers())
+        read_time = time.perf_counter() - start
+        store.close()
+
+    latencies.sort()
+    print(f'{num_submissions} submissions x {num_questions} answers from {num_threads} threads')
+    print(f'submit latency:  p50 {latencies[len(latencies) // 2] * 1e6:8.1f} us  '
+          f'p99 {latencies[int(len(latencies) * 0.99)] * 1e6:8.1f} us')
+    print(f'committed:       {elapsed:8.3f} s  {num_submissions / elapsed:10.0f} submissions/s')
+    print(f'bulk read:       {read_time:8.3f} s  {num_answers / read_time:10.0f} answers/s')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
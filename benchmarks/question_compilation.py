@@ -0,0 +1,45 @@
+"""
+Benchmark of `compile_questions`: validation and compilation time at growing bank sizes, and startup time
+from the compiled artifact against parsing and compiling the question files.
+
+Usage:
+    python -m benchmarks.question_compilation [max_questions]
+"""
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_questions, write_question_bank
+from compile_questions import compile_questions, load_compiled_questions
+from question_bank import QuestionBank
+from utils import load_and_merge_questions
+
+
+def run(max_questions: int = 50000):
+    """Compile synthetic banks of growing sizes and time loading them at startup."""
+    print(f'{"questions":>10s} {"compile":>10s} {"per question":>13s} {"startup, files":>15s} {"startup, compiled":>18s}')
+    num_questions = 1000
+    while num_questions <= max_questions:
+        questions = generate_questions(num_dimensions=20, num_categories=10, num_subcategories=5,
+                                       num_questions=num_questions, num_options=5)
+        with tempfile.TemporaryDirectory() as questions_dir:
+            write_question_bank(questions, questions_dir)
+            start = time.perf_counter()
+            question_bank, issues = compile_questions(questions_dir)
+            compile_time = time.perf_counter() - start
+            assert question_bank is not None, [str(issue) for issue in issues[:5]]
+
+            start = time.perf_counter()
+            QuestionBank(load_and_merge_questions(questions_dir)).version
+            files_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            load_compiled_questions(questions_dir).version
+            compiled_time = time.perf_counter() - start
+        print(f'{num_questions:10d} {compile_time:9.3f}s {compile_time / num_questions * 1e6:11.1f}us '
+              f'{files_time:14.3f}s {compiled_time:17.3f}s')
+        num_questions *= 5 if str(num_questions).startswith('1') else 2
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,57 @@
+"""
+Benchmark of `ResultCache` on a cohort where answer sets repeat, as with retakes and reopened result pages.
+
+Every submission is scored directly and through the cache, printing the time per submission, the hit ratio
+and the memory taken by the cache.
+
+Usage:
+    python -m benchmarks.result_cache [num_submissions] [num_distinct]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_answers, generate_questions
+from question_bank import QuestionBank
+from result_cache import ResultCache
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from utils import group_answers_by_user
+
+
+def run(num_submissions: int = 20000, num_distinct: int = 2000, num_questions: int = 200, seed: int = 0):
+    """Score submissions drawn from a pool of distinct answer sets, with and without the cache."""
+    questions = generate_questions(num_questions=num_questions, seed=seed)
+    question_bank = QuestionBank(questions)
+    answer_sets = list(group_answers_by_user(generate_answers(questions, num_users=num_distinct, seed=seed)).values())
+    rng = random.Random(seed)
+    submissions = [rng.choice(answer_sets) for _ in range(num_submissions)]
+
+    start = time.perf_counter()
+    for user_answers in submissions:
+        result_scores = ProfilingTestScoring(0, questions, user_answers, question_bank) \
+            .calculate_scores_for_profiling_test()
+        adjust_subcategory_scores(result_scores)
+    uncached_time = time.perf_counter() - start
+
+    print(f'{num_submissions} submissions of {num_distinct} distinct answer sets x {num_questions} questions')
+    print(f'{"uncached":22s} {uncached_time / num_submissions * 1e6:9.1f} us/submission')
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, cache in [('cached (memory)', ResultCache(max_bytes=2 ** 30, disk_path=None)),
+                            ('cached (small memory)', ResultCache(max_bytes=2 ** 20, disk_path=None)),
+                            ('cached (memory + disk)', ResultCache(max_bytes=2 ** 20,
+                                                                   disk_path=os.path.join(work_dir, 'cache.sqlite3')))]:
+            start = time.perf_counter()
+            for user_answers in submissions:
+                cache.score(question_bank, user_answers)
+            cached_time = time.perf_counter() - start
+            stats = cache.stats()
+            cache.close()
+            print(f'{name:22s} {cached_time / num_submissions * 1e6:9.1f} us/submission  '
+                  f'x{uncached_time / cached_time:5.1f}  hit ratio {stats["hit_ratio"]:.3f}  '
+                  f'{stats["bytes"] / 2 ** 20:6.1f} MiB in {stats["entries"]} entries, {stats["evictions"]} evictions')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:3]))
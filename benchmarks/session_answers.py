@@ -0,0 +1,97 @@
+"""
+Benchmark of a questionnaire session's answers: `SessionAnswers` against one session state key per answer, and per
+option of list-matching questions, collected by looping over the questions table.
+
+Usage:
+    python -m benchmarks.session_answers [num_questions]
+"""
+import sys
+import time
+
+from benchmarks.synthetic import generate_answers, generate_questions
+from question_bank import QuestionBank
+from session_answers import SessionAnswers
+
+
+def deep_size(obj, seen=None) -> int:
+    """Size in bytes of an object and of the objects it holds, counting shared and interned objects once."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen or (isinstance(obj, int) and -5 <= obj <= 256):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
+
+
+def session_keys(questions, answers):
+    """Store answers as session state keys, the layout used before `SessionAnswers`."""
+    session_state = {}
+    for answer in answers:
+        selected = answer['answer']['selected']
+        if isinstance(selected, dict):
+            for option, option_index in selected.items():
+                session_state[f'answer_for_question_{answer["question_id"]}_{option}'] = option_index
+        else:
+            session_state[f'answer_for_question_{answer["question_id"]}'] = selected
+    return session_state
+
+
+def fetch_from_keys(session_state, questions, stored_answer_key=None):
+    """Collect answers from session state keys by looping over the questions table."""
+    answers = []
+    for question in questions:
+        if stored_answer_key is not None and f'answer_for_question_{question["id"]}' != stored_answer_key:
+            continue
+        if question['question_type'] == 'list-matching':
+            selected = {}
+            for option in question['answer_structure']['options']:
+                key = f'answer_for_question_{question["id"]}_{option}'
+                if key in session_state:
+                    selected[option] = session_state[key]
+            selected = selected or None
+        else:
+            selected = session_state.get(f'answer_for_question_{question["id"]}')
+        if selected is not None:
+            answers.append({'id': question['id'], 'user_id': 123, 'test_id': 0, 'question_id': question['id'],
+                            'answer': {'selected': selected}})
+    return answers
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(num_questions: int = 1000, seed: int = 0):
+    """Compare the memory and collection time of a session that answered every question."""
+    questions = generate_questions(num_questions=num_questions, seed=seed)
+    question_bank = QuestionBank(questions)
+    answers = generate_answers(questions, num_users=1, seed=seed)
+    session_state = session_keys(questions, answers)
+    session_answers = SessionAnswers(question_bank)
+    for answer in answers:
+        session_answers.set(answer['question_id'], answer['answer']['selected'])
+    assert session_answers.answers_table(123) == fetch_from_keys(session_state, questions)
+    last_question_id = questions[-1]['id']
+    print(f'{num_questions} answered questions')
+
+    print(f'{"session keys, bytes":32s} {deep_size(session_state):10d}')
+    print(f'{"session answers, bytes":32s} {deep_size(session_answers._values) + sys.getsizeof(session_answers):10d}')
+    timings = [
+        ('session keys, one answer',
+         lambda: fetch_from_keys(session_state, questions, f'answer_for_question_{last_question_id}'), 20),
+        ('session answers, one answer', lambda: session_answers.answer(last_question_id, 123), 2000),
+        ('session keys, answers table', lambda: fetch_from_keys(session_state, questions), 20),
+        ('session answers, answers table', lambda: session_answers.answers_table(123), 20),
+    ]
+    for name, function, repeat in timings:
+        print(f'{name:32s} {timed(function, repeat):10.3f} ms')
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
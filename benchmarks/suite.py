@@ -0,0 +1,134 @@
+"""
+Benchmark suite of the scoring pipeline stages at production sizes.
+
+Every stage runs on a synthetic question bank and cohort: question loading, question bank compilation,
+scoring, score adjustment and export. Times, throughput and peak memory are printed and saved as JSON,
+and can be compared against a previous run.
+
+Usage:
+    python -m benchmarks.suite --users 10000 --questions 200 --output bench.json --compare previous.json
+"""
+import argparse
+import json
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import generate_answers, generate_questions, write_question_bank
+from question_bank import QuestionBank
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from utils import export_results, group_answers_by_user, load_and_merge_questions
+
+
+def measure(stage: Callable[[], object], repeats: int = 1) -> Dict:
+    """Run a stage, returning its best time and its peak traced memory."""
+    best_time = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        stage()
+        best_time = min(best_time, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best_time, 'peak_memory_bytes': peak_memory}
+
+
+def run(num_users: int = 1000, num_questions: int = 200, num_dimensions: int = 10, num_categories: int = 10,
+        num_subcategories: int = 5, num_options: int = 4, repeats: int = 1, seed: int = 0) -> Dict:
+    """Run every stage of the pipeline and return the report."""
+    questions = generate_questions(num_dimensions=num_dimensions, num_categories=num_categories,
+                                   num_subcategories=num_subcategories, num_questions=num_questions,
+                                   num_options=num_options, seed=seed, category_level_ratio=0.2)
+    answers_table = generate_answers(questions, num_users=num_users, seed=seed)
+    users_answers = group_answers_by_user(answers_table)
+    question_bank = QuestionBank(questions)
+    result_scores: List[Dict] = []
+
+    def score_cohort():
+        result_scores[:] = [
+            ProfilingTestScoring(user_id, questions, user_answers, question_bank).calculate_scores_for_profiling_test()
+            for user_id, user_answers in users_answers.items()
+        ]
+
+    def adjust_cohort():
+        for total_scores in result_scores:
+            adjust_subcategory_scores(total_scores)
+
+    stages = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        questions_dir = f'{work_dir}/questions'
+        write_question_bank(questions, questions_dir)
+        stages['load_and_merge_questions'] = measure(lambda: load_and_merge_questions(questions_dir), repeats)
+        stages['compile_question_bank'] = measure(lambda: QuestionBank(questions), repeats)
+        stages['score'] = measure(score_cohort, repeats)
+        stages['adjust_subcategory_scores'] = measure(adjust_cohort, repeats)
+        stages['export_results'] = measure(
+            lambda: export_results(questions, answers_table, result_scores[0], result_scores[0], export_dir=work_dir),
+            repeats)
+
+    for name, stage in stages.items():
+        if name in ['load_and_merge_questions', 'compile_question_bank']:
+            stage['questions_per_second'] = num_questions / stage['seconds']
+        else:
+            stage['answers_per_second'] = len(answers_table) / stage['seconds']
+            stage['users_per_second'] = num_users / stage['seconds']
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'config': {'users': num_users, 'questions': num_questions, 'dimensions': num_dimensions,
+                   'categories': num_categories, 'subcategories': num_subcategories, 'options': num_options,
+                   'answers': len(answers_table), 'repeats': repeats, 'seed': seed},
+        'stages': stages,
+    }
+
+
+def print_report(report: Dict, previous: Optional[Dict] = None):
+    """Print the stages of a report, with the time ratio to a previous report if given."""
+    config = report['config']
+    print(f'{config["users"]} users, {config["questions"]} questions, {config["answers"]} answers')
+    for name, stage in report['stages'].items():
+        line = f'{name:28s} {stage["seconds"]:9.4f} s  peak {stage["peak_memory_bytes"] / 2 ** 20:8.2f} MiB'
+        if 'answers_per_second' in stage:
+            line += f'  {stage["answers_per_second"]:12.0f} answers/s  {stage["users_per_second"]:10.0f} users/s'
+        else:
+            line += f'  {stage["questions_per_second"]:12.0f} questions/s'
+        if previous and name in previous['stages']:
+            line += f'  x{previous["stages"][name]["seconds"] / stage["seconds"]:.2f} vs previous'
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Benchmark the scoring pipeline on synthetic data.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--dimensions', type=int, default=10)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--subcategories', type=int, default=5)
+    parser.add_argument('--options', type=int, default=4)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Path to save the report as JSON.')
+    parser.add_argument('--compare', help='Path to a previous JSON report to compare against.')
+    args = parser.parse_args(argv)
+
+    report = run(num_users=args.users, num_questions=args.questions, num_dimensions=args.dimensions,
+                 num_categories=args.categories, num_subcategories=args.subcategories, num_options=args.options,
+                 repeats=args.repeats, seed=args.seed)
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            previous = json.load(fh)
+    print_report(report, previous)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
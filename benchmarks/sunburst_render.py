@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of preparing sunburst figures in `visualize`.
+
+Usage:
+    python -m benchmarks.sunburst_render [repeats]
+"""
+import sys
+import time
+
+import plotly.express as px
+
+import visualize
+from visualize import build_sunburst_figures, sunburst_spec
+
+
+def generate_scores(num_dimensions: int = 50, num_categories: int = 20, num_subcategories: int = 20):
+    """Generate adjusted scores with every category split into subcategories."""
+    return {
+        f'dimension {d}': {
+            f'category {c}': {
+                **{f'subcategory {s}': float(s + 1) for s in range(num_subcategories)},
+                'total': float(num_subcategories * (num_subcategories + 1) // 2),
+            }
+            for c in range(num_categories)
+        }
+        for d in range(num_dimensions)
+    }
+
+
+def run(repeats: int = 3):
+    """Time figure preparation with plotly.express, uncached and cached graph_objects."""
+    scores = generate_scores()
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for dimension, categories in scores.items():
+            ids, labels, parents, values = sunburst_spec(dimension, categories)
+            px.sunburst(names=labels, ids=ids, parents=parents, values=values, title=dimension.capitalize(),
+                        branchvalues='total')
+    express_time = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        visualize._figures_cache.clear()
+        build_sunburst_figures(scores)
+    uncached_time = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        build_sunburst_figures(scores)
+    cached_time = (time.perf_counter() - start) / repeats
+
+    print('50 dimensions x 20 categories x 20 subcategories, time per render')
+    print(f'plotly.express:          {express_time * 1000:9.2f} ms')
+    print(f'graph_objects, uncached: {uncached_time * 1000:9.2f} ms')
+    print(f'graph_objects, cached:   {cached_time * 1000:9.2f} ms')
+
+
+if __name__ == '__main__':
+    run(*(int(arg) for arg in sys.argv[1:2]))
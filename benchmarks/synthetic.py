@@ -0,0 +1,133 @@
+"""
+This module contains generators of synthetic question banks and answer cohorts.
+"""
+import json
+import random
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+QUESTION_TYPES = ['single', 'multiple', 'list-matching']
+# Words of synthetic keywords and open answers
+VOCABULARY = [f'word{i}' for i in range(2000)]
+
+
+def generate_questions(num_dimensions: int = 5, num_categories: int = 4, num_subcategories: int = 3,
+                       num_questions: int = 100, num_options: int = 4, seed: Optional[int] = 0,
+                       type_weights: Sequence[float] = (1, 1, 1), category_level_ratio: float = 0) -> List[Dict]:
+    """
+    Generate a questions table with a mix of `single`, `multiple` and `list-matching` questions.
+
+    Parameters:
+        num_dimensions (int, optional): Number of dimensions. Defaults to 5.
+        num_categories (int, optional): Number of categories per dimension. Defaults to 4.
+        num_subcategories (int, optional): Number of subcategories per category. Defaults to 3.
+        num_questions (int, optional): Number of questions. Defaults to 100.
+        num_options (int, optional): Number of options per question. Defaults to 4.
+        seed (int, optional): Seed of the random generator. Defaults to 0.
+        type_weights (Sequence[float], optional): Relative weights of `single`, `multiple` and `list-matching`
+            questions. Defaults to an equal mix.
+        category_level_ratio (float, optional): Share of dimensions scored per category rather than
+            per subcategory. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    category_level_dimensions = int(round(num_dimensions * category_level_ratio))
+    questions = []
+    for question_id in range(1, num_questions + 1):
+        question_type = rng.choices(QUESTION_TYPES, weights=type_weights)[0]
+        dimension_index = rng.randrange(num_dimensions)
+        dimension = f'dimension {dimension_index}'
+        options = [f'Option {question_id}.{i}' for i in range(num_options)]
+        scoring_details = {}
+        for option in options:
+            category = f'category {rng.randrange(num_categories)}'
+            scoring = {'dimension': dimension, 'category': category, 'score': rng.randint(1, 3)}
+            if num_subcategories and dimension_index >= category_level_dimensions:
+                scoring['subcategory'] = f'subcategory {rng.randrange(num_subcategories)}'
+            if question_type == 'list-matching' and rng.random() < 0.5:
+                scoring['negative_score'] = -1
+            scoring_details[option] = [scoring]
+        answer_structure = {'options': options}
+        if question_type == 'list-matching':
+            shuffled = options[:]
+            rng.shuffle(shuffled)
+            scoring_details['correct_pairs'] = dict(zip(options, shuffled))
+            answer_structure['possible_answers'] = shuffled
+        questions.append({
+            'id': question_id,
+            'question_text': f'Question {question_id}?',
+            'question_type': question_type,
+            'answer_structure': answer_structure,
+            'scoring_details': scoring_details,
+        })
+    return questions
+
+
+def generate_open_questions(num_questions: int = 50, num_keywords: int = 30, first_id: int = 1,
+                            num_dimensions: int = 5, num_categories: int = 4, seed: Optional[int] = 0) -> List[Dict]:
+    """Generate open questions with keyword rules of one to three words in their `scoring_details`."""
+    rng = random.Random(seed)
+    questions = []
+    for question_id in range(first_id, first_id + num_questions):
+        dimension = f'dimension {rng.randrange(num_dimensions)}'
+        scoring_details = {}
+        while len(scoring_details) < num_keywords:
+            keyword = ' '.join(rng.sample(VOCABULARY, rng.randint(1, 3)))
+            category = f'category {rng.randrange(num_categories)}'
+            scoring_details[keyword] = [{'dimension': dimension, 'category': category, 'score': rng.randint(1, 3)}]
+        questions.append({
+            'id': question_id,
+            'question_text': f'Question {question_id}?',
+            'question_type': 'open',
+            'answer_structure': {},
+            'scoring_details': scoring_details,
+        })
+    return questions
+
+
+def generate_open_text(rng: random.Random, question: Dict, num_words: int = 40, num_keywords: int = 3) -> str:
+    """Generate the text of an open answer, random words with some keywords of the question mixed in."""
+    words = rng.choices(VOCABULARY, k=num_words)
+    keywords = list(question['scoring_details'])
+    for keyword in rng.sample(keywords, min(rng.randint(0, num_keywords), len(keywords))):
+        words.insert(rng.randrange(len(words) + 1), keyword.upper() if rng.random() < 0.1 else keyword)
+    return ' '.join(words) + '.'
+
+
+def write_question_bank(questions: List[Dict], questions_dir: str):
+    """Write questions into dimension folders, as loaded by `utils.load_and_merge_questions`."""
+    dimension_files = {}
+    for question in questions:
+        scorings = [scoring for name, option_scorings in question['scoring_details'].items()
+                    if name != 'correct_pairs' for scoring in option_scorings]
+        dimension = scorings[0]['dimension'] if scorings else 'none'
+        file_name = 'subcategory.json' if any('subcategory' in scoring for scoring in scorings) else 'category.json'
+        dimension_files.setdefault((dimension, file_name), []).append(question)
+    for (dimension, file_name), dimension_questions in dimension_files.items():
+        dimension_folder = Path(questions_dir) / dimension.replace(' ', '_')
+        dimension_folder.mkdir(parents=True, exist_ok=True)
+        with open(dimension_folder / file_name, 'w', encoding='utf-8') as fh:
+            json.dump(dimension_questions, fh, ensure_ascii=False, indent=2)
+
+
+def generate_answers(questions: List[Dict], num_users: int = 1000, seed: Optional[int] = 0) -> List[Dict]:
+    """Generate an answers table where every user answers every question."""
+    rng = random.Random(seed)
+    answers_table = []
+    answer_id = 0
+    for user_id in range(1, num_users + 1):
+        for question in questions:
+            num_options = len(question['answer_structure'].get('options', []))
+            if question['question_type'] == 'open':
+                selected = generate_open_text(rng, question)
+            elif question['question_type'] == 'single':
+                selected = rng.randrange(num_options)
+            elif question['question_type'] == 'multiple':
+                selected = sorted(rng.sample(range(num_options), rng.randint(0, num_options)))
+            elif question['question_type'] == 'list-matching':
+                selected = {option: rng.randrange(num_options) for option in question['answer_structure']['options']}
+            else:
+                continue
+            answer_id += 1
+            answers_table.append({'id': answer_id, 'user_id': user_id, 'test_id': 0,
+                                  'question_id': question['id'], 'answer': {'selected': selected}})
+    return answers_table
@@ -0,0 +1,156 @@
+"""
+This module contains the compact binary export format for test data and results.
+
+An export is a folder of NumPy `.npy` columns that can be memory-mapped:
+
+- `questions.json`: the questions table, stored once.
+- `answer_<field>.npy`: `id`, `user_id`, `test_id` and `question_id` of every answer.
+- `selected_kind.npy`, `selected_offsets.npy`, `selected_values.npy`, `selected_keys.npy`: selections of every
+  answer as a flat array, answer `i` owns the range `selected_offsets[i]:selected_offsets[i + 1]`.
+  List-matching keys and texts of open answers are indices into the deduplicated string table `strings.json`.
+- `result_scores.json`, `adjusted_scores.json`: score dictionaries.
+
+Answers reference questions by ID, their embedded copies of `scoring_details` are not exported.
+"""
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ANSWER_FIELDS = ['id', 'user_id', 'test_id', 'question_id']
+# Kinds of the `selected` value of an answer
+SELECTED_NONE, SELECTED_INDEX, SELECTED_INDICES, SELECTED_PAIRS, SELECTED_TEXT = 0, 1, 2, 3, 4
+
+
+def _write_json(path: str, data):
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def export_binary(export_dir: str, questions_table: List[Dict], answers_table: List[Dict], result_scores: Dict,
+                  adjusted_scores: Optional[Dict] = None):
+    """Export test data and results to a folder of binary columns."""
+    os.makedirs(export_dir, exist_ok=True)
+    strings, string_index = [], {}
+
+    def string_key(string):
+        if string not in string_index:
+            string_index[string] = len(strings)
+            strings.append(string)
+        return string_index[string]
+
+    kinds = np.empty(len(answers_table), dtype=np.int8)
+    offsets = np.zeros(len(answers_table) + 1, dtype=np.int64)
+    values, keys = [], []
+    for position, answer in enumerate(answers_table):
+        selected = answer['answer'].get('selected')
+        if isinstance(selected, int):
+            kinds[position] = SELECTED_INDEX
+            values.append(selected)
+            keys.append(-1)
+        elif isinstance(selected, list):
+            kinds[position] = SELECTED_INDICES
+            values.extend(selected)
+            keys.extend([-1] * len(selected))
+        elif isinstance(selected, dict):
+            kinds[position] = SELECTED_PAIRS
+            for option, selected_index in selected.items():
+                keys.append(string_key(option))
+                values.append(selected_index)
+        elif isinstance(selected, str):
+            kinds[position] = SELECTED_TEXT
+            keys.append(string_key(selected))
+            values.append(0)
+        else:
+            kinds[position] = SELECTED_NONE
+        offsets[position + 1] = len(values)
+
+    for field in ANSWER_FIELDS:
+        column = np.fromiter((answer[field] for answer in answers_table), dtype=np.int64, count=len(answers_table))
+        np.save(os.path.join(export_dir, f'answer_{field}.npy'), column)
+    np.save(os.path.join(export_dir, 'selected_kind.npy'), kinds)
+    np.save(os.path.join(export_dir, 'selected_offsets.npy'), offsets)
+    np.save(os.path.join(export_dir, 'selected_values.npy'), np.asarray(values, dtype=np.int32))
+    np.save(os.path.join(export_dir, 'selected_keys.npy'), np.asarray(keys, dtype=np.int32))
+    _write_json(os.path.join(export_dir, 'strings.json'), strings)
+    _write_json(os.path.join(export_dir, 'questions.json'), questions_table)
+    _write_json(os.path.join(export_dir, 'result_scores.json'), result_scores)
+    if adjusted_scores:
+        _write_json(os.path.join(export_dir, 'adjusted_scores.json'), adjusted_scores)
+
+
+class BinaryExport:
+    """
+    A loaded binary export.
+
+    Attributes:
+        questions_table (List[Dict]): The exported questions.
+        answers (Dict[str, np.ndarray]): Answer columns, memory-mapped unless loaded with `mmap=False`.
+        strings (List[str]): String table of list-matching option values and open answer texts.
+        result_scores (Dict): The exported result scores.
+        adjusted_scores (Optional[Dict]): The exported adjusted scores, if any.
+    """
+
+    def __init__(self, export_dir: str, mmap: bool = True):
+        """Load a binary export from a folder."""
+        mmap_mode = 'r' if mmap else None
+        self.answers = {
+            name: np.load(os.path.join(export_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+            for name in [*(f'answer_{field}' for field in ANSWER_FIELDS),
+                         'selected_kind', 'selected_offsets', 'selected_values', 'selected_keys']
+        }
+        self.strings = _read_json(os.path.join(export_dir, 'strings.json'))
+        self.questions_table = _read_json(os.path.join(export_dir, 'questions.json'))
+        self.result_scores = _read_json(os.path.join(export_dir, 'result_scores.json'))
+        adjusted_path = os.path.join(export_dir, 'adjusted_scores.json')
+        self.adjusted_scores = _read_json(adjusted_path) if os.path.exists(adjusted_path) else None
+
+    def __len__(self) -> int:
+        return len(self.answers['selected_kind'])
+
+    def selected(self, position: int):
+        """Decode the `selected` value of the answer at a position."""
+        kind = self.answers['selected_kind'][position]
+        start, end = self.answers['selected_offsets'][position:position + 2]
+        values = self.answers['selected_values'][start:end].tolist()
+        if kind == SELECTED_INDEX:
+            return values[0]
+        if kind == SELECTED_INDICES:
+            return values
+        if kind == SELECTED_PAIRS:
+            keys = self.answers['selected_keys'][start:end].tolist()
+            return {self.strings[key]: value for key, value in zip(keys, values)}
+        if kind == SELECTED_TEXT:
+            return self.strings[int(self.answers['selected_keys'][start])]
+        return None
+
+    def answers_table(self) -> List[Dict]:
+        """Rebuild the answers table, without the embedded `scoring_details`."""
+        columns = [self.answers[f'answer_{field}'].tolist() for field in ANSWER_FIELDS]
+        kinds = self.answers['selected_kind'].tolist()
+        offsets = self.answers['selected_offsets'].tolist()
+        values = self.answers['selected_values'].tolist()
+        keys = self.answers['selected_keys'].tolist()
+        answers_table = []
+        for position, row in enumerate(zip(*columns)):
+            kind, start, end = kinds[position], offsets[position], offsets[position + 1]
+            if kind == SELECTED_INDEX:
+                selected = values[start]
+            elif kind == SELECTED_INDICES:
+                selected = values[start:end]
+            elif kind == SELECTED_PAIRS:
+                selected = {self.strings[key]: value for key, value in zip(keys[start:end], values[start:end])}
+            elif kind == SELECTED_TEXT:
+                selected = self.strings[keys[start]]
+            else:
+                selected = None
+            answer = dict(zip(ANSWER_FIELDS, row))
+            answer['answer'] = {'selected': selected}
+            answers_table.append(answer)
+        return answers_table
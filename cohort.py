@@ -0,0 +1,364 @@
+"""
+This module contains cohort analytics over many users' score results.
+
+`CohortScores` holds the results of a cohort in a dense users x buckets matrix, with a fixed column per
+(dimension, category, subcategory) bucket of the question bank, and accepts new results incrementally.
+`CohortSummary` is its precomputed summary: means, a percentile grid and histograms per bucket, small enough
+to be saved as JSON and used to rank a single user's results without the cohort.
+
+A user without a score in a bucket counts as scoring 0 there.
+
+Usage:
+    python cohort.py results.jsonl summary.json [--questions-dir MCSCA_test/questions] [--raw]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch_score import BatchScores, Bucket
+from compile_questions import load_question_bank
+from question_bank import QuestionBank
+
+# Percentiles computed for every bucket, ranks are interpolated between them
+PERCENTILE_GRID = np.linspace(0, 100, 101)
+HISTOGRAM_BINS = 20
+
+
+def cohort_buckets(question_bank: QuestionBank) -> List[Bucket]:
+    """
+    List every bucket a question bank can score, followed by the category totals added by the adjustment.
+
+    Subcategory is None for category totals.
+    """
+    buckets = {}
+    for question in question_bank.compiled:
+        for dimension, category, subcategory, _, _ in question.all_rows():
+            if dimension and category:
+                buckets.setdefault((dimension, category, subcategory if subcategory != 'total' else None), None)
+    for dimension, category, _ in list(buckets):
+        buckets.setdefault((dimension, category, None), None)
+    return list(buckets)
+
+
+def _buckets_key(buckets: Iterable[Bucket]) -> List[List[Optional[str]]]:
+    return [list(bucket) for bucket in buckets]
+
+
+class CohortSummary:
+    """
+    Per-bucket statistics of a cohort.
+
+    Attributes:
+        buckets (List[Bucket]): (dimension, category, subcategory) of each column, subcategory is None for totals.
+        num_users (int): Number of users in the cohort.
+        counts (np.ndarray): Number of users with a score in each bucket.
+        means (np.ndarray): Mean score of each bucket.
+        percentiles (np.ndarray): Scores at `PERCENTILE_GRID` percentiles, percentiles x buckets.
+        histograms (np.ndarray): Number of users per score bin, buckets x bins.
+        bin_edges (np.ndarray): Edges of the score bins, buckets x (bins + 1).
+    """
+    __slots__ = ('buckets', 'column_index', 'num_users', 'counts', 'means', 'percentiles', 'histograms',
+                 'bin_edges', '_key')
+
+    def __init__(self, buckets: List[Bucket], num_users: int, counts: np.ndarray, means: np.ndarray,
+                 percentiles: np.ndarray, histograms: np.ndarray, bin_edges: np.ndarray):
+        """Initialize a CohortSummary object."""
+        self.buckets = [tuple(bucket) for bucket in buckets]
+        self.column_index = {bucket: column for column, bucket in enumerate(self.buckets)}
+        self.num_users = num_users
+        self.counts = counts
+        self.means = means
+        self.percentiles = percentiles
+        self.histograms = histograms
+        self.bin_edges = bin_edges
+        self._key = None
+
+    @property
+    def key(self) -> str:
+        """Content hash of the summary."""
+        if self._key is None:
+            digest = hashlib.sha1(json.dumps(_buckets_key(self.buckets), ensure_ascii=False).encode('utf-8'))
+            for array in [self.counts, self.means, self.percentiles, self.histograms, self.bin_edges]:
+                digest.update(np.ascontiguousarray(array).tobytes())
+            self._key = digest.hexdigest()
+        return self._key
+
+    def percentile(self, bucket: Bucket, q: float) -> Optional[float]:
+        """Score at the `q`-th percentile of a bucket, None if the bucket is not in the summary."""
+        column = self.column_index.get(bucket)
+        if column is None:
+            return None
+        return float(np.interp(q, PERCENTILE_GRID, self.percentiles[:, column]))
+
+    def percentile_rank(self, bucket: Bucket, score: float) -> Optional[float]:
+        """
+        Estimate the percentage of the cohort scoring at or below `score` in a bucket from the percentile grid.
+
+        Returns None if the bucket is not in the summary.
+        """
+        column = self.column_index.get(bucket)
+        if column is None:
+            return None
+        scores = self.percentiles[:, column]
+        position = int(np.searchsorted(scores, score, side='right'))
+        if position == 0:
+            return 0.0
+        if position == len(scores):
+            return 100.0
+        # scores[position - 1] <= score < scores[position]
+        fraction = (score - scores[position - 1]) / (scores[position] - scores[position - 1])
+        low, high = PERCENTILE_GRID[position - 1], PERCENTILE_GRID[position]
+        return float(low + fraction * (high - low))
+
+    def percentile_ranks(self, total_scores: Dict) -> Dict[Bucket, float]:
+        """Estimate the percentile rank of every bucket of a nested score dictionary that is in the summary."""
+        ranks = {}
+        for dimension, categories in total_scores.items():
+            for category, subcategories in categories.items():
+                for subcategory, score in subcategories.items():
+                    bucket = (dimension, category, None if subcategory == 'total' else subcategory)
+                    rank = self.percentile_rank(bucket, score)
+                    if rank is not None:
+                        ranks[bucket] = rank
+        return ranks
+
+    def to_dict(self) -> Dict:
+        """Convert the summary to a JSON-serializable dictionary."""
+        return {'buckets': _buckets_key(self.buckets), 'num_users': self.num_users,
+                'counts': self.counts.tolist(), 'means': self.means.tolist(), 'percentiles': self.percentiles.tolist(),
+                'histograms': self.histograms.tolist(), 'bin_edges': self.bin_edges.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'CohortSummary':
+        """Load a summary converted by `to_dict`."""
+        return cls(data['buckets'], data['num_users'], np.asarray(data['counts'], dtype=np.int64),
+                   np.asarray(data['means'], dtype=np.float64), np.asarray(data['percentiles'], dtype=np.float64),
+                   np.asarray(data['histograms'], dtype=np.int64), np.asarray(data['bin_edges'], dtype=np.float64))
+
+    def save(self, fpath: str):
+        """Save the summary as JSON."""
+        with open(fpath, 'w', encoding='utf-8') as fh:
+            json.dump(self.to_dict(), fh, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, fpath: str) -> 'CohortSummary':
+        """Load a summary saved as JSON."""
+        with open(fpath, 'r', encoding='utf-8') as fh:
+            return cls.from_dict(json.load(fh))
+
+
+class CohortScores:
+    """
+    Score results of a cohort in a dense users x buckets matrix, growing as results arrive.
+
+    Adding results of a user already in the cohort replaces them.
+
+    Attributes:
+        buckets (List[Bucket]): (dimension, category, subcategory) of each column, subcategory is None for totals.
+        column_index (Dict[Bucket, int]): Maps a bucket to its column.
+        user_ids (List[int]): IDs of the users, one per row.
+        row_index (Dict[int, int]): Maps a user ID to its row.
+    """
+
+    def __init__(self, buckets: Sequence[Bucket], capacity: int = 1024):
+        """Initialize an empty cohort over fixed buckets, with room for `capacity` users before growing."""
+        self.buckets = [tuple(bucket) for bucket in buckets]
+        self.column_index = {bucket: column for column, bucket in enumerate(self.buckets)}
+        self.user_ids: List[int] = []
+        self.row_index: Dict[int, int] = {}
+        self._scores = np.zeros((capacity, len(self.buckets)), dtype=np.float64)
+        self._present = np.zeros((capacity, len(self.buckets)), dtype=bool)
+        self._sums = np.zeros(len(self.buckets), dtype=np.float64)
+        self._counts = np.zeros(len(self.buckets), dtype=np.int64)
+        self._summary: Optional[CohortSummary] = None
+        self._sorted: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_question_bank(cls, question_bank: QuestionBank, capacity: int = 1024) -> 'CohortScores':
+        """Initialize an empty cohort over the buckets of a question bank."""
+        return cls(cohort_buckets(question_bank), capacity)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def scores(self) -> np.ndarray:
+        """Users x buckets matrix of scores, 0 where a user has no score."""
+        return self._scores[:len(self.user_ids)]
+
+    @property
+    def present(self) -> np.ndarray:
+        """Users x buckets boolean matrix, True where a user has a score."""
+        return self._present[:len(self.user_ids)]
+
+    def _assign_rows(self, user_ids: Sequence[int]) -> np.ndarray:
+        """Get the rows of users, appending new users and clearing the rows of existing ones."""
+        rows = []
+        for user_id in user_ids:
+            row = self.row_index.get(user_id)
+            if row is None:
+                row = self.row_index[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+            rows.append(row)
+        if len(self.user_ids) > len(self._scores):
+            capacity = max(len(self.user_ids), 2 * len(self._scores))
+            for name in ['_scores', '_present']:
+                array = getattr(self, name)
+                grown = np.zeros((capacity, array.shape[1]), dtype=array.dtype)
+                grown[:len(array)] = array
+                setattr(self, name, grown)
+        rows = np.asarray(rows, dtype=np.int64)
+        self._sums -= self._scores[rows].sum(axis=0)
+        self._counts -= self._present[rows].sum(axis=0)
+        self._scores[rows] = 0
+        self._present[rows] = False
+        self._summary = self._sorted = None
+        return rows
+
+    def _columns(self, buckets: Iterable[Bucket]) -> np.ndarray:
+        columns = []
+        for bucket in buckets:
+            column = self.column_index.get(bucket)
+            if column is None:
+                raise ValueError(f'Bucket `{bucket}` is not in the cohort buckets.')
+            columns.append(column)
+        return np.asarray(columns, dtype=np.int64)
+
+    def add(self, user_id: int, total_scores: Dict):
+        """Add the nested score dictionary of a user, as returned by `ProfilingTestScoring`."""
+        self.add_many({user_id: total_scores})
+
+    def add_many(self, results: Dict[int, Dict]):
+        """Add nested score dictionaries keyed by user ID."""
+        cells, buckets, values = [], [], []
+        for position, total_scores in enumerate(results.values()):
+            for dimension, categories in total_scores.items():
+                for category, subcategories in categories.items():
+                    for subcategory, score in subcategories.items():
+                        cells.append(position)
+                        buckets.append((dimension, category, None if subcategory == 'total' else subcategory))
+                        values.append(score)
+        columns = self._columns(buckets)
+        rows = self._assign_rows(list(results))[np.asarray(cells, dtype=np.int64)]
+        self._scores[rows, columns] = values
+        self._present[rows, columns] = True
+        self._sums += np.bincount(columns, weights=np.asarray(values, dtype=np.float64), minlength=len(self.buckets))
+        self._counts += np.bincount(columns, minlength=len(self.buckets))
+
+    def add_batch(self, batch_scores: BatchScores):
+        """Add the scores of a batch, e.g. from `batch_score.BatchScorer` or `adjust_batch_scores`."""
+        columns = self._columns(batch_scores.buckets)
+        rows = self._assign_rows(batch_scores.user_ids)
+        scores = np.where(batch_scores.touched, batch_scores.scores, 0)
+        self._scores[np.ix_(rows, columns)] = scores
+        self._present[np.ix_(rows, columns)] = batch_scores.touched
+        np.add.at(self._sums, columns, scores.sum(axis=0))
+        np.add.at(self._counts, columns, batch_scores.touched.sum(axis=0))
+
+    def means(self) -> np.ndarray:
+        """Mean score of each bucket, kept up to date as results are added."""
+        if not self.user_ids:
+            return np.zeros(len(self.buckets), dtype=np.float64)
+        return self._sums / len(self.user_ids)
+
+    def summary(self, bins: int = HISTOGRAM_BINS) -> CohortSummary:
+        """Compute the summary of the cohort, reused until results are added."""
+        if not self.user_ids:
+            raise ValueError('The cohort is empty.')
+        if self._summary is not None and self._summary.histograms.shape[1] == bins:
+            return self._summary
+        sorted_scores = self._sorted_scores()
+        num_users, num_buckets = sorted_scores.shape
+        # Linear interpolation between closest ranks, as `np.percentile`, on the already sorted columns
+        positions = PERCENTILE_GRID / 100 * (num_users - 1)
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.minimum(lower + 1, num_users - 1)
+        fractions = (positions - lower)[:, None]
+        percentiles = sorted_scores[lower] * (1 - fractions) + sorted_scores[upper] * fractions
+
+        # Equal-width bins between the minimum and the maximum of each bucket
+        minimums, maximums = sorted_scores[0], sorted_scores[-1]
+        spans = np.where(maximums > minimums, maximums - minimums, 1.0)
+        bin_index = np.minimum(((self.scores - minimums) / spans * bins).astype(np.int64), bins - 1)
+        flat_index = (bin_index + np.arange(num_buckets, dtype=np.int64) * bins).ravel()
+        histograms = np.bincount(flat_index, minlength=num_buckets * bins).reshape(num_buckets, bins)
+        bin_edges = minimums[:, None] + spans[:, None] * np.linspace(0, 1, bins + 1)[None, :]
+
+        self._summary = CohortSummary(self.buckets, num_users, self._counts.copy(), self.means(), percentiles,
+                                      histograms, bin_edges)
+        return self._summary
+
+    def _sorted_scores(self) -> np.ndarray:
+        if self._sorted is None:
+            self._sorted = np.sort(self.scores, axis=0)
+        return self._sorted
+
+    def percentile_ranks(self, user_id: int) -> np.ndarray:
+        """Exact percentage of the cohort scoring at or below a user in each bucket."""
+        row = self.row_index.get(user_id)
+        if row is None:
+            raise ValueError(f'User `{user_id}` is not in the cohort.')
+        sorted_scores = self._sorted_scores()
+        user_scores = self._scores[row]
+        at_or_below = [np.searchsorted(sorted_scores[:, column], user_scores[column], side='right')
+                       for column in range(len(self.buckets))]
+        return np.asarray(at_or_below, dtype=np.float64) / len(self.user_ids) * 100
+
+
+# Process-wide cache shared by all sessions: summary path -> ((modification time, size), summary)
+_summaries_cache: Dict[str, Tuple[Tuple[int, int], CohortSummary]] = {}
+_summaries_cache_lock = threading.Lock()
+
+
+def load_cached_summary(fpath: str) -> CohortSummary:
+    """Load a summary saved as JSON through a process-wide cache, reloading it when the file changes."""
+    stat = os.stat(fpath)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _summaries_cache_lock:
+        cached = _summaries_cache.get(fpath)
+        if cached is None or cached[0] != signature:
+            cached = _summaries_cache[fpath] = (signature, CohortSummary.load(fpath))
+        return cached[1]
+
+
+def iter_result_scores(results_fpath: str, raw: bool = False, chunk_size: int = 10000) -> Iterator[Dict[int, Dict]]:
+    """
+    Read results written by `stream_scores` in chunks of {user_id: scores}, adjusted scores by default.
+
+    Later results of a user replace earlier ones.
+    """
+    chunk = {}
+    with open(results_fpath, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            if line.strip():
+                result = json.loads(line)
+                chunk[result['user_id']] = result['result_scores' if raw else 'adjusted_scores']
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = {}
+    if chunk:
+        yield chunk
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Summarize the score results of a cohort.')
+    parser.add_argument('results', help='Path to the JSON Lines results written by stream_scores.py.')
+    parser.add_argument('output', help='Path to the JSON file to write the summary to.')
+    parser.add_argument('--questions-dir', default=None,
+                        help='Folder with dimension folders of questions, defaults to the mock profiling test.')
+    parser.add_argument('--raw', action='store_true', help='Summarize raw result scores instead of adjusted scores.')
+    args = parser.parse_args(argv)
+    cohort = CohortScores.from_question_bank(load_question_bank(args.questions_dir))
+    for results in iter_result_scores(args.results, args.raw):
+        cohort.add_many(results)
+    cohort.summary().save(args.output)
+    print(f'Summarized {len(cohort)} users over {len(cohort.buckets)} buckets into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
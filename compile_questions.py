@@ -0,0 +1,392 @@
+"""
+This module contains the offline validation and compilation of question bank files.
+
+Every `category.json` and `subcategory.json` of a test folder is checked for problems that would otherwise
+only surface at scoring time, and the questions are compiled into a `QuestionBank` saved as `compiled.json`
+in the questions folder. The scoring service and the batch tools load that artifact at startup instead of
+parsing and compiling the question files, as long as none of the files changed since. The artifact holds data
+only, so reading it never runs code, whoever can write to the questions folder.
+
+Usage:
+    python compile_questions.py [questions_dir ...] [--answers answers.json] [--check]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from open_answers import tokenize
+from question_bank import CompiledQuestion, QuestionBank, files_version, register_shared_question_bank
+from utils import (get_questions_dir, iter_answers, list_question_files, load_and_merge_questions,
+                   question_files_signature)
+
+COMPILED_FILE_NAME = 'compiled.json'
+COMPILED_VERSION = 3
+QUESTION_TYPES = ['single', 'multiple', 'list-matching', 'open']
+
+
+class ValidationIssue:
+    """
+    A problem found in a question file or an answers file.
+
+    Attributes:
+        severity (str): `error` for problems that break scoring, `warning` for suspicious data.
+        source (str): File the problem was found in.
+        question_id: ID of the question, None for problems not tied to a question.
+        message (str): Description of the problem.
+    """
+    __slots__ = ('severity', 'source', 'question_id', 'message')
+
+    def __init__(self, severity: str, source: str, question_id, message: str):
+        """Initialize a ValidationIssue object."""
+        self.severity = severity
+        self.source = source
+        self.question_id = question_id
+        self.message = message
+
+    def __str__(self) -> str:
+        question = f' question {self.question_id}:' if self.question_id is not None else ''
+        return f'{self.source}:{question} {self.severity}: {self.message}'
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_question(question: Dict, source: str) -> List[ValidationIssue]:
+    """Check the structure, options and scoring details of a single question."""
+    issues = []
+    question_id = question.get('id') if isinstance(question, dict) else None
+
+    def report(severity, message):
+        issues.append(ValidationIssue(severity, source, question_id, message))
+
+    def check_scorings(option, scorings):
+        if not isinstance(scorings, list):
+            report('error', f'Scoring details of `{option}` must be a list.')
+            return
+        for scoring in scorings:
+            if not isinstance(scoring, dict):
+                report('error', f'Scoring of `{option}` is not an object.')
+                continue
+            if not scoring.get('dimension') or not scoring.get('category'):
+                report('warning', f'Scoring of `{option}` without a dimension or a category is ignored.')
+            for key in ['score', 'negative_score']:
+                if key in scoring and not _is_number(scoring[key]):
+                    report('error', f'`{key}` of `{option}` is not a number: `{scoring[key]}`.')
+
+    if not isinstance(question, dict):
+        report('error', 'Question is not an object.')
+        return issues
+    if not isinstance(question_id, int) or isinstance(question_id, bool):
+        report('error', f'Question ID `{question_id}` is not an integer.')
+    question_type = question.get('question_type')
+    if question_type not in QUESTION_TYPES:
+        report('error', f'Illegal value for question type: `{question_type}`.')
+        return issues
+
+    scoring_details = question.get('scoring_details')
+    if question_type == 'open':
+        # Open questions have no options, their scoring details are keyword rules
+        if not isinstance(scoring_details, dict):
+            report('error', '`scoring_details` must be an object.')
+            return issues
+        if not scoring_details:
+            report('warning', 'Open question without keyword rules scores nothing.')
+        for keyword, scorings in scoring_details.items():
+            if not tokenize(keyword):
+                report('error', f'Keyword `{keyword}` has no words and never matches.')
+            check_scorings(keyword, scorings)
+        return issues
+
+    options = question.get('answer_structure', {}).get('options')
+    if not isinstance(options, list) or not options or not all(isinstance(option, str) for option in options):
+        report('error', '`answer_structure.options` must be a non-empty list of strings.')
+        return issues
+    if len(set(options)) != len(options):
+        report('error', 'Options are not unique, scoring details cannot tell them apart.')
+    if not isinstance(scoring_details, dict):
+        report('error', '`scoring_details` must be an object.')
+        return issues
+
+    for option, scorings in scoring_details.items():
+        if option == 'correct_pairs':
+            continue
+        if option not in options:
+            report('error', f'Scoring details of `{option}`, which is not an option, are never scored.')
+        check_scorings(option, scorings)
+
+    if question_type == 'list-matching':
+        correct_pairs = scoring_details.get('correct_pairs')
+        if not isinstance(correct_pairs, dict):
+            report('error', '`scoring_details.correct_pairs` must be an object.')
+        else:
+            for option, correct_value in correct_pairs.items():
+                if option not in options:
+                    report('error', f'Correct pair of `{option}`, which is not an option, is never checked.')
+                elif correct_value not in options:
+                    # Selections are indices into the options, so such a pair can never be matched
+                    report('warning', f'Correct pair `{option}` -> `{correct_value}` is not an option, '
+                                      'the pair can never be correct.')
+    elif 'correct_pairs' in scoring_details:
+        report('warning', f'`correct_pairs` is ignored for `{question_type}` questions.')
+    for option in options:
+        if option not in scoring_details:
+            report('warning', f'Option `{option}` has no scoring details and scores nothing.')
+    return issues
+
+
+def validate_totals(question_bank: QuestionBank, sources: Sequence[str]) -> List[ValidationIssue]:
+    """
+    Check that every dimension scores all its categories either with totals or with subcategories.
+
+    `score.adjust_subcategory_scores` rejects results of a dimension where only some categories have totals.
+    """
+    issues = []
+    # Dimension -> category -> levels it is scored at ('total', 'subcategory') and the first question doing so
+    levels: Dict[str, Dict[str, Dict[str, Tuple[int, str]]]] = {}
+    for position, question in enumerate(question_bank.compiled):
+        for dimension, category, subcategory, _, _ in question.all_rows():
+            if dimension and category:
+                level = 'total' if not subcategory or subcategory == 'total' else 'subcategory'
+                levels.setdefault(dimension, {}).setdefault(category, {}).setdefault(
+                    level, (question.id, sources[position]))
+
+    for dimension, categories in levels.items():
+        with_totals = [category for category, category_levels in categories.items() if 'total' in category_levels]
+        without_totals = [category for category in categories if category not in with_totals]
+        if with_totals and without_totals:
+            question_id, source = categories[without_totals[0]]['subcategory']
+            issues.append(ValidationIssue(
+                'error', source, question_id,
+                f'Dimension `{dimension}` scores categories {with_totals} with totals but {without_totals} '
+                'only by subcategory, their results will be rejected as inconsistent.'))
+        elif len(categories) > 1:
+            for category in with_totals:
+                if 'subcategory' in categories[category]:
+                    question_id, source = categories[category]['subcategory']
+                    issues.append(ValidationIssue(
+                        'warning', source, question_id,
+                        f'Category `{category}` of dimension `{dimension}` is scored both with a total and by '
+                        'subcategory, results reaching only its subcategories will be rejected as inconsistent.'))
+    return issues
+
+
+def validate_answers(question_bank: QuestionBank, answers: Iterable[Dict], source: str) -> List[ValidationIssue]:
+    """Check that answers refer to existing questions and options of a question bank."""
+    issues = []
+    for answer in answers:
+        if not isinstance(answer, dict):
+            issues.append(ValidationIssue('error', source, None, 'Answer must be an object.'))
+            continue
+        question_id = answer.get('question_id')
+
+        def report(message):
+            issues.append(ValidationIssue('error', source, question_id, f'User `{answer.get("user_id")}`: {message}'))
+
+        # Unhashable IDs, e.g. lists, cannot be looked up
+        question = None if isinstance(question_id, (list, dict)) else question_bank.get_compiled(question_id)
+        if question is None:
+            report('Question is not in the questions table.')
+            continue
+        if not isinstance(answer.get('answer', {}), dict):
+            report('`answer` must be an object.')
+            continue
+        selected = answer.get('answer', {}).get('selected')
+        if question.question_type in ['single', 'multiple']:
+            # A missing selection is scored as no option selected
+            indices = selected if isinstance(selected, list) else [] if selected is None else [selected]
+            for option_index in indices:
+                if not isinstance(option_index, int) or not 0 <= option_index < len(question.options):
+                    report(f'Selected option `{option_index}` is out of range.')
+        elif question.question_type == 'list-matching':
+            if not isinstance(selected, dict):
+                report('Selection of a list-matching question must be an object.')
+                continue
+            for option, option_index in selected.items():
+                if option not in question.options:
+                    report(f'`{option}` is not an option.')
+                if not isinstance(option_index, int) or not 0 <= option_index < len(question.options):
+                    report(f'Selected option `{option_index}` for `{option}` is out of range.')
+        elif question.question_type == 'open':
+            if selected is not None and not isinstance(selected, str):
+                report('Answer to an open question must be a text.')
+    return issues
+
+
+@contextmanager
+def _gc_paused():
+    """Pause the cyclic garbage collector, which otherwise rescans the growing heap while many objects are built."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def compile_questions(questions_dir: Optional[str] = None, save: bool = True) -> Tuple[Optional[QuestionBank],
+                                                                                      List[ValidationIssue]]:
+    """
+    Validate the question files of a folder and compile them into a question bank.
+
+    Parameters:
+        questions_dir (str, optional): Folder with dimension folders of questions.
+            Defaults to the mock profiling test.
+        save (bool, optional): Whether to save the compiled bank next to the question files. Defaults to True.
+
+    Returns:
+        The compiled bank, None if any error was found, and the issues found.
+    """
+    with _gc_paused():
+        return _compile_questions(get_questions_dir(questions_dir), save)
+
+
+def _compile_questions(questions_path: Path, save: bool) -> Tuple[Optional[QuestionBank], List[ValidationIssue]]:
+    question_files = list_question_files(questions_path)
+    questions, sources, issues = [], [], []
+    for question_path in question_files:
+        source = str(question_path)
+        try:
+            with open(question_path, 'r', encoding='utf-8') as f:
+                file_questions = json.load(f)
+        except ValueError as e:
+            issues.append(ValidationIssue('error', source, None, f'Invalid JSON: {e}'))
+            continue
+        if not isinstance(file_questions, list):
+            issues.append(ValidationIssue('error', source, None, 'File must contain a list of questions.'))
+            continue
+        for question in file_questions:
+            issues.extend(validate_question(question, source))
+            questions.append(question)
+            sources.append(source)
+    if not question_files:
+        issues.append(ValidationIssue('error', str(questions_path), None, 'No question files found.'))
+
+    first_sources = {}
+    for question, source in zip(questions, sources):
+        question_id = question.get('id') if isinstance(question, dict) else None
+        if not isinstance(question_id, int):
+            continue
+        if question_id in first_sources:
+            issues.append(ValidationIssue('error', source, question_id,
+                                          f'Duplicate question ID, already defined in {first_sources[question_id]}.'))
+        else:
+            first_sources[question_id] = source
+    if any(issue.severity == 'error' for issue in issues):
+        return None, issues
+
+    signature = question_files_signature(questions_path)
+    question_bank = QuestionBank(questions, version=files_version(signature))
+    issues.extend(validate_totals(question_bank, sources))
+    if any(issue.severity == 'error' for issue in issues):
+        return None, issues
+    if save:
+        artifact = {'version': COMPILED_VERSION, 'signature': signature, 'questions': questions,
+                    'compiled': [question.to_data() for question in question_bank.compiled]}
+        compiled_path = questions_path / COMPILED_FILE_NAME
+        # Write to a temporary file first, so concurrent readers never see a partial artifact
+        temporary_path = compiled_path.with_name(f'{COMPILED_FILE_NAME}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(artifact, ensure_ascii=False, separators=(',', ':')))
+        os.replace(temporary_path, compiled_path)
+    return question_bank, issues
+
+
+def load_compiled_questions(questions_dir: Optional[str] = None) -> Optional[QuestionBank]:
+    """Load the compiled bank of a questions folder, None if it is missing or any question file changed since."""
+    questions_path = get_questions_dir(questions_dir)
+    compiled_path = questions_path / COMPILED_FILE_NAME
+    signature = question_files_signature(questions_path)
+    try:
+        with open(compiled_path, 'r', encoding='utf-8') as f, _gc_paused():
+            artifact = json.load(f)
+            if (not isinstance(artifact, dict) or artifact.get('version') != COMPILED_VERSION
+                    or artifact.get('signature') != [list(entry) for entry in signature]):
+                return None
+            compiled = [CompiledQuestion.from_data(data) for data in artifact['compiled']]
+    except (OSError, ValueError, KeyError, TypeError):
+        # Missing, truncated, or written by an incompatible version of the code
+        return None
+    return QuestionBank(artifact['questions'], version=files_version(signature), compiled=compiled)
+
+
+# Process-wide cache shared by all sessions: questions folder -> (files signature, question bank)
+_question_banks: Dict[Path, Tuple[Tuple, QuestionBank]] = {}
+_question_banks_lock = threading.Lock()
+
+
+def load_question_bank(questions_dir: Optional[str] = None, compile_missing: bool = True) -> Optional[QuestionBank]:
+    """
+    Get the question bank of a folder through a process-wide cache.
+
+    The bank is loaded from the compiled artifact when it is up to date, otherwise the question files are compiled
+    in memory, or None is returned if `compile_missing` is False. The bank is also returned by
+    `question_bank.get_shared_question_bank(bank.questions)`.
+    """
+    questions_path = get_questions_dir(questions_dir).resolve()
+    signature = question_files_signature(questions_path)
+    with _question_banks_lock:
+        cached = _question_banks.get(questions_path)
+        if cached is None or cached[0] != signature:
+            question_bank = load_compiled_questions(questions_path)
+            if question_bank is None:
+                if not compile_missing:
+                    return None
+                question_bank = QuestionBank(load_and_merge_questions(questions_path), version=files_version(signature))
+            register_shared_question_bank(question_bank)
+            cached = _question_banks[questions_path] = (signature, question_bank)
+        return cached[1]
+
+
+def _answered_question_ids(answers_fpath: str) -> Set[int]:
+    """IDs of the questions referred to by an answers file, streamed so that large files fit in memory."""
+    return {answer['question_id'] for answer in iter_answers(answers_fpath)
+            if isinstance(answer, dict) and isinstance(answer.get('question_id'), int)}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Validate and compile question bank files.')
+    parser.add_argument('questions_dirs', nargs='*', default=[None], metavar='questions_dir',
+                        help='Folders with dimension folders of questions, defaults to the mock profiling test.')
+    parser.add_argument('--answers', action='append', default=[],
+                        help='Answers file (JSON Lines or JSON array) to check against the questions it belongs to, '
+                             'the folder whose questions it refers to most, repeatable.')
+    parser.add_argument('--check', action='store_true', help='Only validate, do not save the compiled bank.')
+    args = parser.parse_args(argv)
+
+    results = [(questions_dir, *compile_questions(questions_dir, save=not args.check))
+               for questions_dir in args.questions_dirs]
+    compiled = [(question_bank, issues) for _, question_bank, issues in results if question_bank is not None]
+    for answers_fpath in args.answers:
+        if not compiled:
+            break
+        # Check the answers against their own bank only, not against the banks of other tests
+        question_ids = _answered_question_ids(answers_fpath)
+        question_bank, issues = max(compiled, key=lambda result: len(question_ids.intersection(result[0].index)))
+        issues.extend(validate_answers(question_bank, iter_answers(answers_fpath), answers_fpath))
+
+    num_errors = 0
+    for questions_dir, question_bank, issues in results:
+        for issue in issues:
+            print(issue)
+        errors = sum(1 for issue in issues if issue.severity == 'error')
+        num_errors += errors
+        questions_path = get_questions_dir(questions_dir)
+        if question_bank is None:
+            print(f'{questions_path}: {errors} errors, not compiled')
+        else:
+            status = 'validated' if args.check else f'compiled to {questions_path / COMPILED_FILE_NAME}'
+            print(f'{questions_path}: {len(question_bank)} questions {status}, '
+                  f'{errors} errors, {len(issues) - errors} warnings')
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == '__main__':
+    main()
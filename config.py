@@ -1 +1,15 @@
+import os
+
 MOCK_PROFTEST_DIR = 'mock_prof_test'
+# Format of `utils.export_results`: 'json' or 'binary'
+EXPORT_FORMAT = 'json'
+# SQLite database of submitted answers and results
+DATABASE_PATH = os.path.join(MOCK_PROFTEST_DIR, 'example_data', 'prof_testing.sqlite3')
+# Memory bound of the process-wide result cache, in bytes of serialized results
+RESULT_CACHE_MAX_BYTES = 64 * 2 ** 20
+# SQLite file backing the result cache across restarts, None to keep results in memory only
+RESULT_CACHE_PATH = None
+# Cohort summary written by `cohort.py`, results are compared with it when set
+COHORT_SUMMARY_PATH = None
+# Rater of answers to open questions, as `module.name` of a class or factory taking a question bank
+OPEN_ANSWER_RATER = 'open_answers.KeywordRater'
@@ -0,0 +1,137 @@
+"""
+This module contains opt-in timers and counters for the scoring pipeline.
+
+Instrumentation is recorded per request (a Streamlit rerun or a batch run) between `start_request` and
+`finish_request`. Outside of an instrumented request `stage` returns a shared no-op context manager and
+`count` returns right away, so instrumented code paths cost next to nothing when disabled.
+
+Instrumentation is enabled for every request by setting the `PROF_TESTING_INSTRUMENT=1` environment variable,
+or per request with `start_request(enabled=True)`, e.g. from the `profile=true` query parameter.
+If `PROF_TESTING_CPROFILE_DIR` is set, a cProfile dump of every instrumented request is saved to that folder.
+Only one profiler can be active per process, so requests running at the same time as a profiled one are only timed.
+"""
+import contextlib
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+ENABLED = os.environ.get('PROF_TESTING_INSTRUMENT', '').lower() in ['1', 'true']
+CPROFILE_DIR = os.environ.get('PROF_TESTING_CPROFILE_DIR')
+
+logger = logging.getLogger(__name__)
+
+_NULL_STAGE = contextlib.nullcontext()
+
+# Held by the request being profiled: enabling a second profiler raises ValueError since Python 3.12
+_profiler_lock = threading.Lock()
+
+
+class Recorder:
+    """
+    Timings and counters of a single request.
+
+    Attributes:
+        request_id (str): Unique ID of the request.
+        stages (List[Dict]): Recorded stages with their name and duration in seconds, in order of completion.
+        counters (Dict[str, int]): Counters by name.
+        profiler (Optional[cProfile.Profile]): Profiler of the request while it runs, if cProfile dumps are enabled
+            and no other request is being profiled.
+    """
+
+    def __init__(self, profile: bool = False):
+        """Initialize a Recorder object."""
+        self.request_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.stages = []
+        self.counters = {}
+        self.profiler = cProfile.Profile() if profile else None
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a stage of the request."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({'stage': name, 'seconds': time.perf_counter() - start})
+
+    def timings(self) -> List[Dict]:
+        """Get the stages and the total time of the request so far."""
+        return [*self.stages, {'stage': 'total', 'seconds': time.perf_counter() - self.started}]
+
+    def report(self) -> Dict:
+        """Get the structured report of the request."""
+        return {'request_id': self.request_id, 'stages': self.timings(), 'counters': self.counters}
+
+
+_recorder: contextvars.ContextVar[Optional[Recorder]] = contextvars.ContextVar('recorder', default=None)
+
+
+def start_request(enabled: bool = False) -> Optional[Recorder]:
+    """Start recording a request if instrumentation is enabled globally or for this request."""
+    _stop_profiler(_recorder.get())
+    if not (enabled or ENABLED):
+        _recorder.set(None)
+        return None
+    recorder = Recorder(profile=CPROFILE_DIR is not None and _profiler_lock.acquire(blocking=False))
+    _recorder.set(recorder)
+    if recorder.profiler is not None:
+        try:
+            recorder.profiler.enable()
+        except ValueError:
+            # Another profiler, e.g. of a debugger, is already active
+            recorder.profiler = None
+            _profiler_lock.release()
+    return recorder
+
+
+def _stop_profiler(recorder: Optional[Recorder]) -> Optional[cProfile.Profile]:
+    """Disable the profiler of a recorder and let other requests be profiled, returning the disabled profiler."""
+    if recorder is None or recorder.profiler is None:
+        return None
+    profiler, recorder.profiler = recorder.profiler, None
+    profiler.disable()
+    _profiler_lock.release()
+    return profiler
+
+
+def get_recorder() -> Optional[Recorder]:
+    """Get the recorder of the current request, None if it is not instrumented."""
+    return _recorder.get()
+
+
+def finish_request() -> Optional[Dict]:
+    """Stop recording the current request, log its report and save its cProfile dump."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return None
+    _recorder.set(None)
+    report = recorder.report()
+    profiler = _stop_profiler(recorder)
+    if profiler is not None:
+        os.makedirs(CPROFILE_DIR, exist_ok=True)
+        report['cprofile'] = os.path.join(CPROFILE_DIR, f'{recorder.request_id}.prof')
+        profiler.dump_stats(report['cprofile'])
+    logger.info(json.dumps(report))
+    return report
+
+
+def stage(name: str):
+    """Time a stage of the current request, a no-op if it is not instrumented."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NULL_STAGE
+    return recorder.stage(name)
+
+
+def count(name: str, increment: int = 1):
+    """Increment a counter of the current request, a no-op if it is not instrumented."""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.counters[name] = recorder.counters.get(name, 0) + increment
@@ -0,0 +1,258 @@
+"""
+This module contains the on-disk manifest of question files and lazy loading of questions.
+
+The manifest lists, for every question file, the IDs, types, dimensions, categories and subcategories of its
+questions, so that questions can be located and filtered without parsing every file. It is stored as
+`manifest.json` in the questions folder and rebuilt per file when a file is added, removed, or changes modification time or size.
+"""
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import instrumentation
+from question_bank import files_version
+from question_filter import QuestionIndex, filter_key
+from utils import get_questions_dir, question_files_signature
+
+MANIFEST_FILE_NAME = 'manifest.json'
+MANIFEST_VERSION = 2
+
+
+def scoring_values(question: Dict, field: str) -> List:
+    """List the values of a field referenced in the scoring details of a question, in order of appearance."""
+    values = []
+    for option, scorings in question.get('scoring_details', {}).items():
+        if option == 'correct_pairs':
+            continue
+        for scoring in scorings:
+            value = scoring.get(field)
+            if value and value not in values:
+                values.append(value)
+    return values
+
+
+def question_dimensions(question: Dict) -> List[str]:
+    """List the dimensions referenced in the scoring details of a question, in order of appearance."""
+    return scoring_values(question, 'dimension')
+
+
+def manifest_question(question: Dict) -> Dict:
+    """Summarize a question into its manifest entry."""
+    return {'id': question['id'], 'question_type': question['question_type'],
+            'dimensions': question_dimensions(question), 'categories': scoring_values(question, 'category'),
+            'subcategories': scoring_values(question, 'subcategory')}
+
+
+def index_question_file(questions_path: Path, question_path: Path) -> Dict:
+    """Parse a question file into its manifest entry."""
+    stat = question_path.stat()
+    with open(question_path, 'r', encoding='utf-8') as f:
+        questions = json.load(f)
+    return {
+        'path': question_path.relative_to(questions_path).as_posix(),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'questions': [manifest_question(question) for question in questions],
+    }
+
+
+def load_manifest(questions_dir: Optional[str] = None, save: bool = True) -> Dict:
+    """
+    Load the manifest of a questions folder, rebuilding the entries of changed files.
+
+    Parameters:
+        questions_dir (str, optional): Folder with dimension folders of questions.
+            Defaults to the mock profiling test.
+        save (bool, optional): Whether to save the manifest if it was rebuilt. Defaults to True.
+    """
+    questions_path = get_questions_dir(questions_dir)
+    manifest_path = questions_path / MANIFEST_FILE_NAME
+    previous_entries = {}
+    if manifest_path.exists():
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous_manifest = json.load(f)
+            if previous_manifest.get('version') == MANIFEST_VERSION:
+                previous_entries = {entry['path']: entry for entry in previous_manifest['files']}
+        except (OSError, ValueError):
+            previous_entries = {}
+
+    entries, changed = [], False
+    for path, mtime_ns, size in question_files_signature(questions_path):
+        entry = previous_entries.get(path)
+        if entry is None or entry['mtime_ns'] != mtime_ns or entry['size'] != size:
+            entry = index_question_file(questions_path, questions_path / path)
+            changed = True
+        entries.append(entry)
+    changed = changed or len(entries) != len(previous_entries)
+
+    manifest = {'version': MANIFEST_VERSION, 'files': entries}
+    if changed and save:
+        # Write to a temporary file first, so concurrent readers never see a partial manifest
+        temporary_path = manifest_path.with_name(f'{MANIFEST_FILE_NAME}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(temporary_path, manifest_path)
+    return manifest
+
+
+class LazyQuestions(Sequence):
+    """
+    A read-only sequence of the merged questions of a folder, parsing question files only when needed.
+
+    Questions are in the same order as returned by `utils.load_and_merge_questions`. Filtered views of the
+    questions, see `filter`, share the parsed files of the sequence they were taken from.
+
+    Attributes:
+        questions_path (Path): Folder with dimension folders of questions.
+        manifest (Dict): Manifest of the question files.
+    """
+
+    def __init__(self, questions_dir: Optional[str] = None, manifest: Optional[Dict] = None):
+        """Initialize a LazyQuestions object from the manifest of a questions folder."""
+        self.questions_path = get_questions_dir(questions_dir)
+        self.manifest = manifest if manifest is not None else load_manifest(self.questions_path)
+        # Per position: (file index, position in the file)
+        self._positions: List[Tuple[int, int]] = [
+            (file_index, question_index)
+            for file_index, entry in enumerate(self.manifest['files'])
+            for question_index in range(len(entry['questions']))
+        ]
+        self._files: Dict[int, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._is_view = False
+        self._version = None
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        file_index, question_index = self._positions[position]
+        return self._load_file(file_index)[question_index]
+
+    def __iter__(self):
+        for file_index, question_index in self._positions:
+            yield self._load_file(file_index)[question_index]
+
+    def _manifest_questions(self) -> List[Dict]:
+        """Manifest entries of the questions in order."""
+        files = self.manifest['files']
+        return [files[file_index]['questions'][question_index] for file_index, question_index in self._positions]
+
+    def question_ids(self) -> List[int]:
+        """IDs of the questions in order, read from the manifest without parsing files."""
+        return [question['id'] for question in self._manifest_questions()]
+
+    @property
+    def version(self) -> str:
+        """
+        Version of the questions from the manifest entries of their files, without parsing them.
+
+        The version of all the questions of a folder is the one of `compile_questions.load_question_bank`,
+        views also depend on the positions of their questions.
+        """
+        if self._version is None:
+            signature = [(entry['path'], entry['mtime_ns'], entry['size']) for entry in self.manifest['files']]
+            self._version = files_version([signature, self._positions]) if self._is_view else files_version(signature)
+        return self._version
+
+    @property
+    def index(self) -> QuestionIndex:
+        """Filter index of the questions, built from the manifest without parsing files."""
+        if self._index is None:
+            self._index = QuestionIndex(self, field_values=[
+                {'id': [question['id']], 'question_type': [question['question_type']],
+                 'dimension': question['dimensions'], 'category': question['categories'],
+                 'subcategory': question['subcategories']}
+                for question in self._manifest_questions()
+            ])
+        return self._index
+
+    @property
+    def loaded_files(self) -> int:
+        """Number of question files parsed so far."""
+        return len(self._files)
+
+    def _load_file(self, file_index: int) -> List[Dict]:
+        questions = self._files.get(file_index)
+        if questions is None:
+            with self._lock:
+                questions = self._files.get(file_index)
+                if questions is None:
+                    question_path = self.questions_path / self.manifest['files'][file_index]['path']
+                    with open(question_path, 'r', encoding='utf-8') as f:
+                        questions = json.load(f)
+                    self._files[file_index] = questions
+                    instrumentation.count('question_files_loaded')
+        return questions
+
+    def subset(self, positions: Iterable[int]) -> 'LazyQuestions':
+        """Get a view of the questions at the given positions, sharing the parsed files of these questions."""
+        view = copy.copy(self)
+        view._positions = [self._positions[position] for position in positions]
+        view._is_view = True
+        view._version = None
+        view._index = None
+        return view
+
+    def filter(self, filters: Iterable[str]) -> 'LazyQuestions':
+        """Get a view of the questions matching filters in the syntax of `question_filter.QuestionIndex`."""
+        return self.subset(self.index.positions(filters))
+
+    def positions(self, question_types: Optional[Iterable[str]] = None, dimensions: Optional[Iterable[str]] = None,
+                  question_ids: Optional[Iterable[int]] = None) -> List[int]:
+        """Find positions of questions matching all given criteria from the manifest, without parsing files."""
+        question_types = set(question_types) if question_types is not None else None
+        dimensions = set(dimensions) if dimensions is not None else None
+        question_ids = set(question_ids) if question_ids is not None else None
+        return [position for position, question in enumerate(self._manifest_questions())
+                if (question_types is None or question['question_type'] in question_types)
+                and (dimensions is None or dimensions.intersection(question['dimensions']))
+                and (question_ids is None or question['id'] in question_ids)]
+
+    def select(self, question_types: Optional[Iterable[str]] = None, dimensions: Optional[Iterable[str]] = None,
+               question_ids: Optional[Iterable[int]] = None) -> List[Dict]:
+        """Load the questions matching all given criteria, parsing only the files that hold them."""
+        return [self[position] for position in self.positions(question_types, dimensions, question_ids)]
+
+
+# Process-wide cache shared by all sessions: questions folder -> cache entry with the files signature,
+# lazy questions and their filtered views per canonical filter, least recently used first
+_lazy_questions_cache: Dict[Path, Dict] = {}
+_lazy_questions_cache_lock = threading.Lock()
+FILTERED_QUESTIONS_CACHE_SIZE = 64
+
+
+def load_lazy_questions(questions_dir: Optional[str] = None,
+                        filters: Optional[Sequence[str]] = None) -> LazyQuestions:
+    """
+    Get the lazily loaded questions of a folder through a process-wide cache, optionally filtered.
+
+    Filters follow the syntax of `question_filter.QuestionIndex` and are resolved from the manifest, so that
+    only the files of the questions actually used are parsed. The cache is invalidated when a question file
+    is added, removed, or its modification time or size changes.
+    """
+    questions_path = get_questions_dir(questions_dir).resolve()
+    signature = question_files_signature(questions_path)
+    key = filter_key(filters or [])
+    with _lazy_questions_cache_lock:
+        entry = _lazy_questions_cache.get(questions_path)
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'questions': LazyQuestions(questions_path), 'filtered': OrderedDict()}
+            _lazy_questions_cache[questions_path] = entry
+        if not key:
+            return entry['questions']
+        filtered_questions = entry['filtered'].get(key)
+        if filtered_questions is None:
+            filtered_questions = entry['filtered'][key] = entry['questions'].filter(filters)
+            if len(entry['filtered']) > FILTERED_QUESTIONS_CACHE_SIZE:
+                entry['filtered'].popitem(last=False)
+        entry['filtered'].move_to_end(key)
+        return filtered_questions
@@ -0,0 +1,85 @@
+"""
+This module contains the multi-process scoring runner for large answers tables.
+
+Users are sharded across a process pool. The question bank is handed to every worker once by the pool
+initializer: inherited through `fork` where it is available and the caller runs no other threads, otherwise
+its questions are pickled once per worker for a `forkserver` or `spawn` worker, never per task. Results are
+merged in the order users first appear in the answers table, so the output is identical to scoring users one
+by one.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from question_bank import QuestionBank
+from score import ProfilingTestScoring
+from utils import group_answers_by_user
+
+# Question bank of the current worker process
+_worker_question_bank: Optional[QuestionBank] = None
+
+
+def _init_worker(question_bank: Optional[QuestionBank], questions: Optional[List[Dict]]):
+    """Set the question bank of a worker, inherited from the parent process or built from its questions."""
+    global _worker_question_bank
+    _worker_question_bank = question_bank if question_bank is not None else QuestionBank(questions)
+
+
+def _score_shard(shard: List[Tuple[int, List[Dict]]]) -> List[Tuple[int, Dict]]:
+    """Score a shard of users with the question bank of the worker."""
+    question_bank = _worker_question_bank
+    return [
+        (user_id, ProfilingTestScoring(user_id, question_bank.questions, user_answers, question_bank)
+         .calculate_scores_for_profiling_test())
+        for user_id, user_answers in shard
+    ]
+
+
+def score_serial(answers_table: List[Dict], question_bank: QuestionBank) -> Dict[int, Dict]:
+    """Score every user of an answers table in the current process."""
+    return {
+        user_id: ProfilingTestScoring(user_id, question_bank.questions, user_answers, question_bank)
+        .calculate_scores_for_profiling_test()
+        for user_id, user_answers in group_answers_by_user(answers_table).items()
+    }
+
+
+def score_parallel(answers_table: List[Dict], question_bank: QuestionBank, workers: Optional[int] = None,
+                   shards_per_worker: int = 4) -> Dict[int, Dict]:
+    """
+    Score every user of an answers table across a pool of worker processes.
+
+    Parameters:
+        answers_table (List[Dict]): Answers of many users.
+        question_bank (QuestionBank): Compiled questions to score against.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        shards_per_worker (int, optional): Number of shards per worker, more shards balance the load better.
+            Defaults to 4.
+
+    Returns:
+        Dict[int, Dict]: Total scores keyed by user ID, in the order users first appear in `answers_table`.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return score_serial(answers_table, question_bank)
+
+    users_answers = list(group_answers_by_user(answers_table).items())
+    shard_size = max(1, -(-len(users_answers) // (workers * shards_per_worker)))
+    shards = [users_answers[start:start + shard_size] for start in range(0, len(users_answers), shard_size)]
+
+    start_methods = multiprocessing.get_all_start_methods()
+    if 'fork' in start_methods and threading.active_count() == 1:
+        # Workers inherit the question bank with the initializer arguments, without pickling it
+        mp_context = multiprocessing.get_context('fork')
+        initargs = (question_bank, None)
+    else:
+        # Forking a process with other threads can deadlock the children on locks held by those threads
+        mp_context = multiprocessing.get_context('forkserver' if 'forkserver' in start_methods else 'spawn')
+        initargs = (None, list(question_bank.questions))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                             initargs=initargs) as executor:
+        return {user_id: total_scores
+                for shard_results in executor.map(_score_shard, shards)
+                for user_id, total_scores in shard_results}
@@ -0,0 +1,235 @@
+"""
+This module contains the AnswerStore class, durable storage of answers and score results in SQLite.
+
+Writes are put on a queue and committed in batches by a background writer thread, so saving never blocks
+the caller on disk I/O. Reads go through a small pool of connections. The database runs in WAL mode,
+so readers are not blocked by the writer.
+"""
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from config import DATABASE_PATH
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS answers (
+    user_id INTEGER NOT NULL,
+    test_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    selected TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (user_id, test_id, question_id)
+);
+CREATE TABLE IF NOT EXISTS results (
+    user_id INTEGER NOT NULL,
+    test_id INTEGER NOT NULL,
+    result_scores TEXT NOT NULL,
+    adjusted_scores TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (user_id, test_id)
+);
+'''
+
+_STOP = object()
+# Attempts at committing a batch of writes failing with an operational error, and the delay before the first retry
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_DELAY = 0.1
+
+
+class AnswerStore:
+    """
+    Answers and score results keyed by user ID and test ID.
+
+    Attributes:
+        db_path (str): Path to the SQLite database.
+        batch_size (int): Maximum number of queued writes committed in one transaction.
+    """
+
+    def __init__(self, db_path: str = DATABASE_PATH, batch_size: int = 1000, pool_size: int = 4):
+        """Open the database, creating its tables, and start the background writer."""
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._errors: List[BaseException] = []
+        connection = self._connect()
+        try:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        self._writer = threading.Thread(target=self._write_loop, name='answer-store-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a read connection from the pool."""
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List):
+        results = [row for kind, row in batch if kind == 'results']
+        with connection:
+            # Submissions in queue order, each replacing the whole answer set of its users' tests
+            for tests, rows in (item for kind, item in batch if kind == 'answers'):
+                connection.executemany('DELETE FROM answers WHERE user_id = ? AND test_id = ?', tests)
+                connection.executemany(
+                    'INSERT OR REPLACE INTO answers (user_id, test_id, question_id, selected, updated) '
+                    'VALUES (?, ?, ?, ?, ?)', rows)
+            if results:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO results '
+                    '(user_id, test_id, result_scores, adjusted_scores, updated) VALUES (?, ?, ?, ?, ?)',
+                    results)
+
+    def _write_loop(self):
+        connection = self._connect()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                # Drain whatever else is queued, up to a batch
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = any(item is _STOP for item in batch)
+                try:
+                    writes = [item for item in batch if item is not _STOP]
+                    for attempt in range(WRITE_ATTEMPTS):
+                        try:
+                            self._write_batch(connection, writes)
+                            break
+                        except sqlite3.OperationalError:
+                            # Such as a database locked by another process, worth another try
+                            if attempt == WRITE_ATTEMPTS - 1:
+                                raise
+                            time.sleep(WRITE_RETRY_DELAY * 2 ** attempt)
+                except Exception as e:
+                    # Reported by `flush` and `close`, the writer keeps serving later writes
+                    self._errors.append(e)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _raise_error(self):
+        if self._errors:
+            raise self._errors.pop(0)
+
+    def save_answers(self, answers_table: List[Dict], user_id: Optional[int] = None, test_id: int = 0):
+        """
+        Queue a submission of answers for saving, replacing all previous answers of the users' tests it holds.
+
+        Previous answers to questions left out of the submission are deleted in the same transaction. Pass
+        `user_id` and `test_id` to also replace the answers of that test when the submission holds none.
+        Selections are serialized right away, so selections that cannot be saved raise here.
+        """
+        updated = time.time()
+        rows = [(answer['user_id'], answer.get('test_id', 0), answer['question_id'],
+                 json.dumps(answer['answer'].get('selected'), ensure_ascii=False), updated)
+                for answer in answers_table]
+        tests = {(row[0], row[1]) for row in rows}
+        if user_id is not None:
+            tests.add((user_id, test_id))
+        self._queue.put(('answers', (list(tests), rows)))
+
+    def save_results(self, user_id: int, test_id: int, result_scores: Dict, adjusted_scores: Optional[Dict] = None):
+        """Queue score results of a user's test for saving."""
+        self._queue.put(('results', (
+            user_id, test_id, json.dumps(result_scores, ensure_ascii=False),
+            json.dumps(adjusted_scores, ensure_ascii=False) if adjusted_scores is not None else None, time.time())))
+
+    def flush(self):
+        """Wait until every queued write is committed, raising the first write error if any."""
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks and self._writer.is_alive():
+                self._queue.all_tasks_done.wait(0.1)
+        self._raise_error()
+        if self._queue.unfinished_tasks:
+            raise RuntimeError(f'The writer of `{self.db_path}` stopped with writes still queued.')
+
+    def close(self):
+        """Commit queued writes, stop the writer and close the connections, raising the first write error if any."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+        self._raise_error()
+
+    def iter_answers(self, user_id: Optional[int] = None, test_id: Optional[int] = None,
+                     fetch_size: int = 10000) -> Iterator[Dict]:
+        """
+        Stream answers ordered by user ID, test ID and question ID, in the answers table format.
+
+        Answers of a user's test are contiguous, so they can be scored with `stream_scores.score_answer_groups`.
+        """
+        conditions, parameters = [], []
+        if user_id is not None:
+            conditions.append('user_id = ?')
+            parameters.append(user_id)
+        if test_id is not None:
+            conditions.append('test_id = ?')
+            parameters.append(test_id)
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        with self.connection() as connection:
+            cursor = connection.execute(
+                f'SELECT user_id, test_id, question_id, selected FROM answers {where}'
+                'ORDER BY user_id, test_id, question_id', parameters)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row_user_id, row_test_id, question_id, selected in rows:
+                    yield {'id': question_id, 'user_id': row_user_id, 'test_id': row_test_id,
+                           'question_id': question_id, 'answer': {'selected': json.loads(selected)}}
+
+    def load_answers(self, user_id: Optional[int] = None, test_id: Optional[int] = None) -> List[Dict]:
+        """Load answers in the answers table format, optionally for a single user or test."""
+        return list(self.iter_answers(user_id, test_id))
+
+    def load_results(self, user_id: int, test_id: int) -> Optional[Dict]:
+        """Load the score results of a user's test, None if there are none."""
+        with self.connection() as connection:
+            row = connection.execute(
+                'SELECT result_scores, adjusted_scores FROM results WHERE user_id = ? AND test_id = ?',
+                (user_id, test_id)).fetchone()
+        if row is None:
+            return None
+        return {'result_scores': json.loads(row[0]),
+                'adjusted_scores': json.loads(row[1]) if row[1] is not None else None}
+
+
+# Process-wide stores shared by all sessions, by database path
+_stores: Dict[str, AnswerStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_answer_store(db_path: str = DATABASE_PATH) -> AnswerStore:
+    """Get the process-wide store of a database, opening it on first use."""
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = _stores[db_path] = AnswerStore(db_path)
+            # Commit writes still queued when the process exits
+            atexit.register(store.close)
+        return store
@@ -0,0 +1,225 @@
+"""
+This module contains the QuestionBank class, a compiled and indexed view of the questions table.
+
+The bank is built once from the output of `utils.load_and_merge_questions()` and can be shared
+by any number of `ProfilingTestScoring` instances, so that scoring never has to scan the questions
+table or resolve `scoring_details` by option name.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+Score = Union[int, float]
+# (dimension, category, subcategory, score, negative_score)
+ScoreRow = Tuple[Optional[str], Optional[str], Optional[str], Score, Score]
+
+
+def compile_scorings(scorings: Iterable[Dict]) -> Tuple[ScoreRow, ...]:
+    """Convert a list of `scoring_details` entries into a tuple of score rows."""
+    return tuple(
+        (scoring.get('dimension'), scoring.get('category'), scoring.get('subcategory'),
+         scoring.get('score', 0), scoring.get('negative_score', 0))
+        for scoring in scorings
+    )
+
+
+def files_version(signature: Sequence) -> str:
+    """Version of questions loaded from files, a hash of the paths, modification times and sizes of the files."""
+    content = json.dumps(list(signature), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class CompiledQuestion:
+    """
+    A compact, pre-resolved representation of a single question.
+
+    Attributes:
+        id (int): ID of the question.
+        question_type (str): Type of the question (`single`, `multiple`, `list-matching` or `open`).
+        options (Tuple[str, ...]): Options of the question in their display order.
+        option_rows (Tuple[Tuple[ScoreRow, ...], ...]): Score rows for each option index.
+        matching (Dict[str, Tuple[Tuple[ScoreRow, ...], Optional[str]]]): For list-matching questions,
+            maps an option value to its score rows and its correct pair value.
+        keyword_rows (Tuple[Tuple[str, Tuple[ScoreRow, ...]], ...]): For open questions, the keywords of
+            `scoring_details` with their score rows, see `open_answers.KeywordRater`.
+    """
+    __slots__ = ('id', 'question_type', 'options', 'option_rows', 'matching', 'keyword_rows')
+
+    def __init__(self, question: Dict):
+        """Compile a question dictionary."""
+        scoring_details = question.get('scoring_details', {})
+        self.id = question['id']
+        self.question_type = question['question_type']
+        self.options = tuple(question.get('answer_structure', {}).get('options', []))
+        self.option_rows = tuple(compile_scorings(scoring_details.get(option, [])) for option in self.options)
+        self.matching = {}
+        if self.question_type == 'list-matching':
+            correct_pairs = scoring_details.get('correct_pairs', {})
+            for option_value, scorings in scoring_details.items():
+                if option_value == 'correct_pairs':
+                    continue
+                self.matching[option_value] = (compile_scorings(scorings), correct_pairs.get(option_value))
+        self.keyword_rows = ()
+        if self.question_type == 'open':
+            self.keyword_rows = tuple((keyword, compile_scorings(scorings))
+                                      for keyword, scorings in scoring_details.items())
+
+    def to_data(self) -> List:
+        """Serialize the compiled question to plain JSON data, see `from_data`."""
+        return [self.id, self.question_type, list(self.options), self.option_rows,
+                {option_value: list(matching) for option_value, matching in self.matching.items()},
+                self.keyword_rows]
+
+    @classmethod
+    def from_data(cls, data: Sequence) -> 'CompiledQuestion':
+        """Rebuild a compiled question from the data returned by `to_data`, without its question dictionary."""
+        question_id, question_type, options, option_rows, matching, keyword_rows = data
+        question = cls.__new__(cls)
+        question.id = question_id
+        question.question_type = question_type
+        question.options = tuple(options)
+        question.option_rows = tuple(tuple(map(tuple, rows)) for rows in option_rows)
+        question.matching = {option_value: (tuple(map(tuple, rows)), correct_pair)
+                             for option_value, (rows, correct_pair) in matching.items()}
+        question.keyword_rows = tuple((keyword, tuple(map(tuple, rows))) for keyword, rows in keyword_rows)
+        return question
+
+    def all_rows(self) -> Iterator[ScoreRow]:
+        """Iterate over every score row the question can add, whatever the answer."""
+        for rows in self.option_rows:
+            yield from rows
+        for rows, _ in self.matching.values():
+            yield from rows
+        for _, rows in self.keyword_rows:
+            yield from rows
+
+
+class LazyCompiledQuestions(Sequence):
+    """Compiled questions of a lazily loaded questions table, each compiled when it is first accessed."""
+    __slots__ = ('_questions', '_compiled')
+
+    def __init__(self, questions: Sequence[Dict]):
+        """Prepare the compilation of a questions table without loading any question."""
+        self._questions = questions
+        self._compiled: List[Optional[CompiledQuestion]] = [None] * len(questions)
+
+    def __len__(self) -> int:
+        return len(self._compiled)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        compiled = self._compiled[position]
+        if compiled is None:
+            # Compiling the same question twice from concurrent sessions is harmless, both results are equal
+            compiled = self._compiled[position] = CompiledQuestion(self._questions[position])
+        return compiled
+
+
+class QuestionBank:
+    """
+    An indexed collection of compiled questions.
+
+    Questions tables that can list their question IDs without loading the questions, such as
+    `manifest.LazyQuestions`, are indexed from those IDs and compiled on demand, so that the bank
+    never loads more questions than are used.
+
+    Attributes:
+        questions (Sequence[Dict]): The original list of questions.
+        compiled (Sequence[CompiledQuestion]): Compiled questions in the same order as `questions`.
+        index (Dict[int, int]): Maps a question ID to its position in `questions`.
+    """
+    __slots__ = ('questions', 'compiled', 'index', '_version', '__weakref__')
+
+    def __init__(self, questions: Sequence[Dict], version: Optional[str] = None,
+                 compiled: Optional[Sequence[CompiledQuestion]] = None):
+        """
+        Build the bank from a list of question dictionaries.
+
+        Parameters:
+            questions (Sequence[Dict]): The questions table.
+            version (str, optional): Version of the questions, such as `files_version` of the files they were
+                loaded from. Defaults to the `version` of the questions table if it has one, otherwise to a hash
+                of the questions computed on first use.
+            compiled (Sequence[CompiledQuestion], optional): The compiled questions, e.g. read from a compiled
+                artifact. Defaults to compiling the questions.
+        """
+        self.questions = questions
+        question_ids = getattr(questions, 'question_ids', None)
+        if compiled is not None:
+            self.compiled = compiled
+            question_ids = [question.id for question in compiled]
+        elif question_ids is not None:
+            self.compiled = LazyCompiledQuestions(questions)
+            question_ids = question_ids()
+        else:
+            self.compiled = [CompiledQuestion(question) for question in questions]
+            question_ids = [question['id'] for question in questions]
+        self.index = {}
+        for position, question_id in enumerate(question_ids):
+            # Keep the first occurrence to match a linear search over the questions table
+            self.index.setdefault(question_id, position)
+        if version is None and isinstance(getattr(questions, 'version', None), str):
+            version = questions.version
+        self._version = version
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self.index
+
+    @property
+    def version(self) -> str:
+        """Version of the questions, changes whenever a question changes."""
+        if self._version is None:
+            content = json.dumps(list(self.questions), sort_keys=True, ensure_ascii=False)
+            self._version = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        return self._version
+
+    def get_question(self, question_id: int) -> Optional[Dict]:
+        """Fetch an original question dictionary by its ID."""
+        position = self.index.get(question_id)
+        return None if position is None else self.questions[position]
+
+    def get_compiled(self, question_id: int) -> Optional[CompiledQuestion]:
+        """Fetch a compiled question by its ID."""
+        position = self.index.get(question_id)
+        return None if position is None else self.compiled[position]
+
+
+# Process-wide banks shared by all sessions: id of a questions list -> (questions list, bank),
+# the list is kept referenced so that its id is not reused
+_shared_banks: 'OrderedDict[int, Tuple[Sequence[Dict], QuestionBank]]' = OrderedDict()
+_shared_banks_lock = threading.Lock()
+SHARED_BANKS_SIZE = 32
+
+
+def get_shared_question_bank(questions: Sequence[Dict]) -> QuestionBank:
+    """
+    Get the question bank of a questions list, compiled once per list object and shared by all sessions.
+
+    Only use it with sequences that are not modified, such as those returned by `manifest.load_lazy_questions`
+    or the questions of a bank returned by `compile_questions.load_question_bank`.
+    """
+    with _shared_banks_lock:
+        cached = _shared_banks.get(id(questions))
+        if cached is not None and cached[0] is questions:
+            _shared_banks.move_to_end(id(questions))
+            return cached[1]
+        question_bank = QuestionBank(questions)
+        _shared_banks[id(questions)] = (questions, question_bank)
+        if len(_shared_banks) > SHARED_BANKS_SIZE:
+            _shared_banks.popitem(last=False)
+        return question_bank
+
+
+def register_shared_question_bank(question_bank: QuestionBank):
+    """Share an already built bank, e.g. loaded from a compiled artifact, as the bank of its questions list."""
+    with _shared_banks_lock:
+        _shared_banks[id(question_bank.questions)] = (question_bank.questions, question_bank)
+        _shared_banks.move_to_end(id(question_bank.questions))
+        if len(_shared_banks) > SHARED_BANKS_SIZE:
+            _shared_banks.popitem(last=False)
@@ -0,0 +1,103 @@
+"""
+This module contains the QuestionIndex class, inverted indexes for filtering questions.
+
+Filters are comma-separated terms. A term is either `field:value`, where field is one of `type`
+(or `question_type`), `dimension`, `category`, `subcategory` and `id`, or a bare value matching any field,
+e.g. `single,multiple` or `type:single,dimension:mindset`. Values are matched exactly, ignoring case.
+Terms on the same field are combined with OR, different fields (bare values counting as one field)
+with AND.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+FIELD_ALIASES = {'type': 'question_type', 'question_type': 'question_type', 'dimension': 'dimension',
+                 'category': 'category', 'subcategory': 'subcategory', 'id': 'id'}
+ANY_FIELD = '*'
+
+
+def _normalize(value) -> str:
+    return str(value).strip().casefold()
+
+
+def filter_key(filters: Iterable[str]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """Canonical form of filter terms, equal for all spellings and orders of the same filter, e.g. as a cache key."""
+    return tuple(sorted((field, tuple(sorted(values))) for field, values in QuestionIndex.parse(filters).items()))
+
+
+def question_field_values(question: Dict) -> Dict[str, Set]:
+    """Values of every indexed field of a question, the scoring fields collected over all its options."""
+    values = {'id': {question['id']}, 'question_type': {question['question_type']},
+              'dimension': set(), 'category': set(), 'subcategory': set()}
+    for option, scorings in question.get('scoring_details', {}).items():
+        if option == 'correct_pairs':
+            continue
+        for scoring in scorings:
+            for field in ['dimension', 'category', 'subcategory']:
+                if scoring.get(field):
+                    values[field].add(scoring[field])
+    return values
+
+
+class QuestionIndex:
+    """
+    Inverted indexes over the fields of a list of questions.
+
+    Attributes:
+        questions (Sequence[Dict]): The indexed questions.
+        postings (Dict[str, Dict[str, List[int]]]): Field -> normalized value -> positions of matching questions,
+            in ascending order. Field `*` indexes the values of every field.
+    """
+
+    def __init__(self, questions: Sequence[Dict], field_values: Optional[Sequence[Dict[str, Iterable]]] = None):
+        """
+        Build the indexes of a list of questions.
+
+        Parameters:
+            questions (Sequence[Dict]): The questions to index.
+            field_values (Sequence[Dict[str, Iterable]], optional): Values of every field per question, as returned
+                by `question_field_values`, e.g. read from a manifest. Defaults to the values of the questions.
+        """
+        self.questions = questions
+        self.postings = {field: {} for field in [*set(FIELD_ALIASES.values()), ANY_FIELD]}
+        if field_values is None:
+            field_values = [question_field_values(question) for question in questions]
+        for position, values in enumerate(field_values):
+            any_values = set()
+            for field, values_of_field in values.items():
+                for value in {_normalize(value) for value in values_of_field}:
+                    self.postings[field].setdefault(value, []).append(position)
+                    any_values.add(value)
+            for value in any_values:
+                self.postings[ANY_FIELD].setdefault(value, []).append(position)
+
+    @staticmethod
+    def parse(filters: Iterable[str]) -> Dict[str, Set[str]]:
+        """Parse filter terms into field -> normalized values, bare values go to field `*`."""
+        criteria = {}
+        for term in filters:
+            field, separator, value = str(term).partition(':')
+            field = FIELD_ALIASES.get(field.strip().casefold()) if separator else None
+            if field is None:
+                field, value = ANY_FIELD, term
+            value = _normalize(value)
+            if value:
+                criteria.setdefault(field, set()).add(value)
+        return criteria
+
+    def positions(self, filters: Iterable[str]) -> List[int]:
+        """Find positions of the questions matching the filters, all questions if there are no filter terms."""
+        criteria = self.parse(filters)
+        if not criteria:
+            return list(range(len(self.questions)))
+        matches = None
+        # Start with the most selective field to keep intersections small
+        for field_matches in sorted(
+                ({position for value in values for position in self.postings[field].get(value, [])}
+                 for field, values in criteria.items()), key=len):
+            matches = field_matches if matches is None else matches & field_matches
+            if not matches:
+                return []
+        return sorted(matches)
+
+    def filter(self, filters: Iterable[str]) -> List[Dict]:
+        """Get the questions matching the filters, in their original order."""
+        return [self.questions[position] for position in self.positions(filters)]
@@ -1,13 +1,24 @@
 import copy
 import json
+import uuid
 
 import streamlit as st
 
-from score import ProfilingTestScoring, adjust_subcategory_scores
-from utils import load_and_merge_questions, export_results
+import instrumentation
+from cohort import load_cached_summary
+from config import COHORT_SUMMARY_PATH
+from manifest import load_lazy_questions
+from persistence import get_answer_store
+from question_bank import get_shared_question_bank
+from score import IncrementalProfilingTestScoring, adjust_subcategory_scores
+from session_answers import SessionAnswers
+from utils import export_results
 from visualize import visualize_adjusted_scores
 
 DEBUG = False
+PROFILE = False
+USER_ID = 0
+TEST_ID = 0
 questions_table = {}
 
 
@@ -15,6 +26,20 @@ def rerun_script():
     st.rerun()
 
 
+def parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_session_user_id():
+    # A random ID per session, so that the submissions of different test takers never overwrite each other
+    if 'user_id' not in st.session_state:
+        st.session_state['user_id'] = uuid.uuid4().int >> 65  # Fits an SQLite INTEGER
+    return st.session_state['user_id']
+
+
 def validate_current_question_index():
     index = st.session_state.get('current_question_index', 0)
     max_index = len(questions_table) - 1
@@ -27,74 +52,56 @@ def validate_current_question_index():
             rerun_script()
 
 
-def validate_session_state(key, expected_type, valid_range=None):
-    try:
-        value = st.session_state.get(key, None)
-        if value is None:
-            return True
-
-        if not isinstance(value, expected_type):
-            raise ValueError(f'Invalid type for key \'{key}\'. Expected {expected_type}.')
-
-        if valid_range is not None and value not in valid_range:
-            raise ValueError(f'Invalid range for key \'{key}\'. Should be in {valid_range}.')
-
-    except ValueError as e:
-        st.error(f'Error with key \'{key}\' in session state: {e}')
-        return False
-
-    return True
-
-
-def fetch_answers_for_user(user_id, stored_answer_key=None):
-    answers_table = []
-    for question in questions_table:
-        question_id = question['id']
-        question_type = question['question_type']
-        if question_type == 'list-matching':
-            # Create a dictionary to store all selected values for different options
-            if stored_answer_key is not None and stored_answer_key != stored_answer_key:
-                continue
-            selected_answers = {}
-            for option in question['answer_structure']['options']:
-                stored_option_key = get_stored_answer_key(f'{question_id}_{option}')
-                if stored_option_key in st.session_state:
-                    selected_answers[option] = st.session_state[stored_option_key]
-            # Append the combined answer dictionary to answers_table for list-matching question type
-            if selected_answers:
-                answer_dict = {'id': question_id, 'user_id': user_id, 'test_id': 0, 'question_id': question_id,
-                               'answer': {'selected': selected_answers,
-                                          'scoring_details (FOR DEBUG ONLY)': question['scoring_details']}}
-                answers_table.append(answer_dict)
-                if stored_answer_key is not None and stored_answer_key == get_stored_answer_key(question_id):
-                    return answers_table
-        elif question_type in ['single', 'multiple']:
-            stored_option_key = get_stored_answer_key(question_id)
-            if stored_answer_key is not None and stored_option_key != stored_answer_key:
-                continue
-            if stored_option_key in st.session_state:
-                answer_dict = {'id': question_id, 'user_id': user_id, 'test_id': 0, 'question_id': question_id,
-                               'answer': {'selected': st.session_state[stored_option_key],
-                                          'scoring_details (FOR DEBUG ONLY)': question['scoring_details']}}
-                answers_table.append(answer_dict)
-                if stored_answer_key is not None:
-                    return answers_table
-        else:
-            raise ValueError(f'Illegal value for question type: `{question_type}`.')
-    return answers_table
+def get_session_answers(questions):
+    # The answers of this session, rebound to the question bank of the current questions table
+    question_bank = get_shared_question_bank(questions)
+    session_answers = st.session_state.get('answers')
+    if session_answers is None:
+        session_answers = st.session_state['answers'] = SessionAnswers(question_bank)
+    elif session_answers.question_bank is not question_bank:
+        session_answers = st.session_state['answers'] = session_answers.rebind(question_bank)
+    return session_answers
 
 
-def get_stored_answer_key(question_id):
-    return f'answer_for_question_{question_id}'
+def fetch_answer_for_question(user_id, question):
+    return get_session_answers(questions_table).answer(question['id'], user_id, test_id=TEST_ID,
+                                                       with_scoring_details=True)
+
+
+def get_live_scorer(questions):
+    scorer = st.session_state.get('live_scorer')
+    if scorer is None or scorer.questions is not questions:
+        # The compiled bank is shared by all sessions
+        session_answers = get_session_answers(questions)
+        scorer = IncrementalProfilingTestScoring(user_id=USER_ID, questions=questions,
+                                                 question_bank=session_answers.question_bank)
+        for answer in session_answers.answers_table(user_id=USER_ID, test_id=TEST_ID):
+            scorer.update_answer(answer)
+        st.session_state['live_scorer'] = scorer
+    return scorer
+
+
+def update_live_scores(question):
+    # Apply the change of a single answer to the live scores, if they are being kept
+    scorer = st.session_state.get('live_scorer')
+    if scorer is None or question['id'] not in scorer.question_bank:
+        return
+    answer_dict = get_session_answers(questions_table).answer(question['id'], user_id=USER_ID, test_id=TEST_ID)
+    with instrumentation.stage('score'):
+        if answer_dict is None:
+            scorer.remove_answer(question['id'])
+        else:
+            scorer.update_answer(answer_dict)
 
 
 def handle_single_question(question, col):
     question_id = question['id']
-    stored_answer_key = get_stored_answer_key(question_id)
-    if stored_answer_key not in st.session_state:
-        st.session_state[stored_answer_key] = 0  # Initialize
+    session_answers = get_session_answers(questions_table)
+    if question_id not in session_answers:
+        session_answers.set(question_id, 0)  # Initialize
+        update_live_scores(question)
 
-    stored_answer = st.session_state[stored_answer_key]
+    stored_answer = session_answers.get(question_id)
 
     answer = col.radio(
         'Select an option:', question['answer_structure']['options'],
@@ -104,39 +111,38 @@ def handle_single_question(question, col):
 
     new_answer_index = question['answer_structure']['options'].index(answer)
     if new_answer_index != stored_answer:
-        st.session_state[stored_answer_key] = new_answer_index
+        session_answers.set(question_id, new_answer_index)
+        update_live_scores(question)
         st.rerun()
     return answer
 
 
 def handle_multiple_question(question, col2):
     question_id = question['id']
-    stored_answer_key = get_stored_answer_key(question_id)
-    if not validate_session_state(stored_answer_key, list):
-        return
-    stored_indices = st.session_state.get(stored_answer_key, [])
+    session_answers = get_session_answers(questions_table)
+    stored_indices = session_answers.get(question_id) or []
     answer = col2.multiselect(
         'Select one or more options:', question['answer_structure']['options'],
         default=[question['answer_structure']['options'][i] for i in stored_indices],
         key=f'answer_{question_id}'
     )
 
-    new_answer_indices = [question['answer_structure']['options'].index(opt) for opt in answer]
+    # Selections are stored in option order
+    new_answer_indices = sorted(question['answer_structure']['options'].index(opt) for opt in answer)
     if new_answer_indices != stored_indices:
-        st.session_state[stored_answer_key] = new_answer_indices
+        session_answers.set(question_id, new_answer_indices)
+        update_live_scores(question)
         st.rerun()
     return answer
 
 
 def handle_list_matching_question(question, col2):
-    answer = {}
+    question_id = question['id']
+    session_answers = get_session_answers(questions_table)
+    stored_pairs = session_answers.get(question_id) or {}
+    answer, new_pairs, changed = {}, {}, False
     for option in question['answer_structure']['options']:
-        question_id = question['id']
-        stored_answer_key = get_stored_answer_key(f'{question_id}_{option}')
-
-        if not validate_session_state(stored_answer_key, int, range(len(question['answer_structure']['options']))):
-            continue
-        stored_index = st.session_state.get(stored_answer_key, 0)
+        stored_index = stored_pairs.get(option, 0)
 
         selected_answer = col2.selectbox(
             f'Match {option} with:',
@@ -146,18 +152,33 @@ def handle_list_matching_question(question, col2):
         )
 
         new_answer_index = question['answer_structure']['options'].index(selected_answer)
-        if new_answer_index != stored_index:
-            st.session_state[stored_answer_key] = new_answer_index
+        changed = changed or new_answer_index != stored_index
+        answer[option] = selected_answer
+        new_pairs[option] = new_answer_index
+
+    if new_pairs != stored_pairs:
+        session_answers.set(question_id, new_pairs)
+        update_live_scores(question)
+        if changed:
             st.rerun()
+    return answer
 
-        answer[option] = selected_answer
-        st.session_state[stored_answer_key] = question['answer_structure']['options'].index(selected_answer)
 
+def handle_open_question(question, col2):
+    question_id = question['id']
+    session_answers = get_session_answers(questions_table)
+    stored_text = session_answers.get(question_id) or ''
+    answer = col2.text_area('Your answer:', value=stored_text, key=f'answer_{question_id}')
+
+    if answer != stored_text:
+        session_answers.set(question_id, answer)
+        update_live_scores(question)
+        st.rerun()
     return answer
 
 
 def initialize():
-    global DEBUG, questions_table
+    global DEBUG, PROFILE, USER_ID, TEST_ID, questions_table
     st.set_page_config(layout='wide')
     # Fetch query parameters
     query_params = st.experimental_get_query_params()
@@ -167,13 +188,21 @@ def initialize():
         DEBUG = True
     elif isinstance(DEBUG, str) and DEBUG.lower() == 'false':
         DEBUG = False
+    # Instrument the stages of this rerun with `profile=true`
+    PROFILE = str(query_params.get('profile', ['false'])[0]).lower() == 'true'
+    instrumentation.start_request(enabled=PROFILE)
+    # The test taker from `user_id=<int>`, otherwise the session's own ID, and the test from `test_id=<int>`
+    USER_ID = parse_id(query_params.get('user_id', [None])[0])
+    if USER_ID is None:
+        USER_ID = get_session_user_id()
+    TEST_ID = parse_id(query_params.get('test_id', [None])[0]) or 0
     filter_param = query_params.get('filter', [""])[0]
     filters = filter_param.split(',')
     if isinstance(filters, list):  # Ensure it's a list
         filters = [str(f) for f in filters]  # Convert all to string just in case
-    questions_table = load_and_merge_questions()
-    if filters:
-        questions_table = [q for q in questions_table if any(f in str(q) for f in filters)]
+    with instrumentation.stage('load_questions'):
+        # Filter from the manifest, so that only the question files of the questions actually shown are parsed
+        questions_table = load_lazy_questions(filters=filters if filter_param else None)
     validate_current_question_index()
     st.session_state['current_question_index'] = st.session_state.get('current_question_index', 0)
     st.markdown('<style>.small-font pre { font-size: 12px; }</style>', unsafe_allow_html=True)
@@ -208,31 +237,66 @@ def render_current_question(questions, debug):
             handle_multiple_question(question, col2)
         elif question['question_type'] == 'list-matching':
             handle_list_matching_question(question, col2)
+        elif question['question_type'] == 'open':
+            handle_open_question(question, col2)
         else:
             raise AssertionError(f'Question type `{question["question_type"]}` is undefined.')
 
         if debug:
-            debug_answers = fetch_answers_for_user(user_id=123, stored_answer_key=get_stored_answer_key(question['id']))
+            with instrumentation.stage('fetch_answer_for_question (debug)'):
+                debug_answer = fetch_answer_for_question(user_id=USER_ID, question=question)
+                debug_answers = [debug_answer] if debug_answer is not None else []
             debug_answers_text = json.dumps(debug_answers, indent=2, ensure_ascii=False)
             col4.code(f'Output - Answers: {debug_answers_text}', language='json')
-
-
-def process_answers(questions):
-    answers_table = fetch_answers_for_user(user_id=123)
-    scorer = ProfilingTestScoring(user_id=123, questions=questions, user_answers=answers_table)
-    result_scores = scorer.calculate_scores_for_profiling_test()
-    adjusted_scores = adjust_subcategory_scores(result_scores)
+    return col4
+
+
+def process_answers(questions, submitted=False):
+    with instrumentation.stage('fetch_answers_for_user'):
+        answers_table = get_session_answers(questions).answers_table(user_id=USER_ID, test_id=TEST_ID,
+                                                                     with_scoring_details=True)
+    with instrumentation.stage('score'):
+        # The live scorer keeps the totals of the current answers up to date
+        scorer = get_live_scorer(questions)
+        result_scores = scorer.calculate_scores_for_profiling_test()
+    with instrumentation.stage('adjust_subcategory_scores'):
+        adjusted_scores = adjust_subcategory_scores(result_scores)
     if DEBUG:
-        export_results(questions, answers_table, result_scores, adjusted_scores)
+        with instrumentation.stage('export_results'):
+            export_results(list(questions), answers_table, result_scores, adjusted_scores)
+    if submitted:
+        # Saved by a background writer, so the Submit click does not wait for the database
+        with instrumentation.stage('persist'):
+            answer_store = get_answer_store()
+            answer_store.save_answers(answers_table, user_id=USER_ID, test_id=TEST_ID)
+            answer_store.save_results(user_id=USER_ID, test_id=TEST_ID, result_scores=result_scores,
+                                      adjusted_scores=adjusted_scores)
     st.title('Profiling Test Results')
-    visualize_adjusted_scores(adjusted_scores, show_zero_scores=True)
+    with instrumentation.stage('visualize'):
+        cohort = load_cached_summary(COHORT_SUMMARY_PATH) if COHORT_SUMMARY_PATH else None
+        visualize_adjusted_scores(adjusted_scores, show_zero_scores=True, cohort=cohort)
     extracted_answers = []
     for answer in answers_table:
         if scorer.fetch_question_by_id(answer['question_id'])['question_type'] == 'list-matching':
             extracted_answers.append(answer)
 
 
-initialize()
-render_current_question(questions=questions_table, debug=DEBUG)
-if ((st.session_state['current_question_index'] == len(questions_table) - 1) and st.button('Submit')) or DEBUG:
-    process_answers(questions=questions_table)
+def show_timings(col):
+    recorder = instrumentation.get_recorder()
+    if recorder is not None:
+        col.table([{'stage': timing['stage'], 'ms': round(timing['seconds'] * 1000, 2)}
+                   for timing in recorder.timings()])
+
+
+# `st.rerun()` and `st.stop()` end the script by raising, finish the request anyway so that its report is
+# logged and its profiler disabled
+try:
+    initialize()
+    debug_col = render_current_question(questions=questions_table, debug=DEBUG)
+    submitted = (st.session_state['current_question_index'] == len(questions_table) - 1) and st.button('Submit')
+    if submitted or DEBUG:
+        process_answers(questions=questions_table, submitted=submitted)
+    if DEBUG:
+        show_timings(debug_col)
+finally:
+    instrumentation.finish_request()
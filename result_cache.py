@@ -0,0 +1,177 @@
+"""
+This module contains the ResultCache class, a cache of score results keyed by answer-set fingerprints.
+
+A fingerprint is a hash of the question bank version, the rater of open answers and the normalized selections of
+an answer set, so identical answer sets share their results whoever submitted them, and any change to the
+questions or the rater invalidates them.
+Results are kept in memory with LRU eviction under a byte bound, shared by all sessions of the process, and
+can be backed by an SQLite file that survives restarts.
+"""
+import hashlib
+import json
+import marshal
+import sqlite3
+import threading
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import OPEN_ANSWER_RATER, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_PATH
+from question_bank import QuestionBank
+from score import ProfilingTestScoring, adjust_subcategory_scores
+
+DISK_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS result_cache (
+    fingerprint TEXT PRIMARY KEY,
+    results TEXT NOT NULL
+);
+'''
+
+
+def normalize_selected(selected):
+    """Normalize a selection so that equivalent selections have the same representation."""
+    if isinstance(selected, list):
+        # Options of a multiple choice question are scored independently of their order
+        return tuple(sorted(selected))
+    if isinstance(selected, dict):
+        return tuple(sorted(selected.items()))
+    return selected
+
+
+def fingerprint(question_bank: QuestionBank, answers: Iterable[Dict], rater: str = OPEN_ANSWER_RATER) -> str:
+    """
+    Hash the version of a question bank, the rater of open answers and the selections of an answer set.
+
+    Answers are keyed by question ID, so their order and the user who gave them do not matter. Selections are
+    hashed as plain tuples in marshal format 2, which has no shared references and costs a fraction of JSON.
+    """
+    selections = sorted([(answer['question_id'], normalize_selected(answer['answer'].get('selected')))
+                         for answer in answers], key=itemgetter(0))
+    return hashlib.sha1(marshal.dumps((question_bank.version, rater, selections), 2)).hexdigest()
+
+
+class ResultCache:
+    """
+    Score results by fingerprint, with LRU eviction under a memory bound and an optional on-disk store.
+
+    Results are stored serialized, so callers always get their own copies and may modify them.
+
+    Attributes:
+        max_bytes (int): Maximum total size of the serialized results kept in memory.
+        disk_path (str, optional): Path to the SQLite file backing the cache, None to keep results in memory only.
+        hits (int): Lookups answered from memory.
+        disk_hits (int): Lookups answered from the on-disk store.
+        misses (int): Lookups that found no results.
+        evictions (int): Results evicted from memory to stay under `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_MAX_BYTES, disk_path: Optional[str] = RESULT_CACHE_PATH):
+        """Initialize an empty cache, opening the on-disk store if a path is given."""
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = None
+        if disk_path is not None:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, timeout=30)
+            self._disk.execute('PRAGMA journal_mode=WAL')
+            self._disk.execute('PRAGMA synchronous=NORMAL')
+            self._disk.executescript(DISK_SCHEMA)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key: str, value: str):
+        # Called with the lock held
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(key) + len(previous)
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            evicted_key, evicted_value = self._entries.popitem(last=False)
+            self._bytes -= len(evicted_key) + len(evicted_value)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Tuple[Dict, Dict]]:
+        """Get the result scores and adjusted scores of a fingerprint, None if they are not cached."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            elif self._disk is not None:
+                row = self._disk.execute('SELECT results FROM result_cache WHERE fingerprint = ?', (key,)).fetchone()
+                if row is not None:
+                    value = row[0]
+                    self._store(key, value)
+                    self.disk_hits += 1
+            if value is None:
+                self.misses += 1
+                return None
+        result_scores, adjusted_scores = json.loads(value)
+        return result_scores, adjusted_scores
+
+    def put(self, key: str, result_scores: Dict, adjusted_scores: Dict):
+        """Cache the result scores and adjusted scores of a fingerprint."""
+        value = json.dumps([result_scores, adjusted_scores], ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._store(key, value)
+            if self._disk is not None:
+                with self._disk:
+                    self._disk.execute('INSERT OR REPLACE INTO result_cache (fingerprint, results) VALUES (?, ?)',
+                                       (key, value))
+
+    def score(self, question_bank: QuestionBank, user_answers: Iterable[Dict], user_id: int = 0) -> Tuple[Dict, Dict]:
+        """Get the result scores and adjusted scores of an answer set, scoring it only on a cache miss."""
+        user_answers = list(user_answers)
+        key = fingerprint(question_bank, user_answers)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        scoring = ProfilingTestScoring(user_id, question_bank.questions, user_answers, question_bank)
+        result_scores = scoring.calculate_scores_for_profiling_test()
+        adjusted_scores = adjust_subcategory_scores(result_scores)
+        self.put(key, result_scores, adjusted_scores)
+        return result_scores, adjusted_scores
+
+    def stats(self) -> Dict:
+        """Counters for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'hit_ratio': (self.hits + self.disk_hits) / lookups if lookups else 0.0}
+
+    def clear(self):
+        """Drop the results kept in memory, the on-disk store is left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def close(self):
+        """Close the on-disk store."""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+
+# Process-wide cache shared by all sessions
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Get the process-wide result cache, configured by `config.RESULT_CACHE_MAX_BYTES` and `RESULT_CACHE_PATH`."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
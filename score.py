@@ -2,7 +2,12 @@
 This module contains the ProfilingTestScoring class responsible for calculating profiling test scores.
 """
 import json
-from typing import List, Dict, Optional
+from fractions import Fraction
+from typing import List, Dict, Optional, Tuple, Union
+
+import instrumentation
+from open_answers import OpenAnswerRater, get_open_answer_rater
+from question_bank import QuestionBank, ScoreRow
 
 
 class ProfilingTestScoring:
@@ -14,37 +19,70 @@ class ProfilingTestScoring:
         questions (List[Dict]): List of questions in the test.
         user_answers (List[Dict]): List of user answers.
         total_scores (Dict): A nested dictionary to hold the total scores.
+        question_bank (QuestionBank): Compiled and indexed questions, may be shared between scorers.
+        open_rater (OpenAnswerRater): Rater of answers to open questions, defaults to the shared rater of the
+            question bank.
     """
 
-    def __init__(self, user_id: int, questions: List[Dict], user_answers: List[Dict]):
+    def __init__(self, user_id: int, questions: List[Dict], user_answers: List[Dict],
+                 question_bank: Optional[QuestionBank] = None, open_rater: Optional[OpenAnswerRater] = None):
         """Initialize a ProfilingTestScoring object."""
         self.user_id = user_id
         self.total_scores = {}
         self.questions = questions
         self.user_answers = user_answers
+        self.question_bank = question_bank if question_bank is not None else QuestionBank(questions)
+        self._open_rater = open_rater
+        # Open answers collected while scoring a whole test, rated in one batch
+        self._pending_open_answers = None
+        # Keys with float scores -> [number of float scores, exact sum of all scores], see `add_to_total`
+        self._exact_sums = {}
+
+    @property
+    def open_rater(self) -> OpenAnswerRater:
+        """The rater of open answers, created on first use."""
+        if self._open_rater is None:
+            self._open_rater = get_open_answer_rater(self.question_bank)
+        return self._open_rater
 
     def process_score(self, dimension: str, category: Optional[str], subcategory: Optional[str], score: int):
         """Process and update the scores for a given dimension, category, and subcategory."""
+        instrumentation.count('process_score')
         if not all([dimension, category, score]):
             return
 
-        if dimension not in self.total_scores:
-            self.total_scores[dimension] = {}
-
-        if not category:
-            self.total_scores[dimension]['total'] = self.total_scores[dimension].get('total', 0) + score
+        subcategory = subcategory or 'total'
+        subcategories = self.total_scores.setdefault(dimension, {}).setdefault(category, {})
+        if not self._exact_sums and not isinstance(score, float):
+            # Integer scores only so far, see `add_to_total`
+            subcategories[subcategory] = subcategories.get(subcategory, 0) + score
             return
+        self.add_to_total(subcategories, (dimension, category, subcategory), score)
 
-        if category not in self.total_scores[dimension]:
-            self.total_scores[dimension][category] = {}
+    def add_to_total(self, subcategories: Dict, key: Tuple[str, str, str], score: Union[int, float], sign: int = 1):
+        """
+        Add a signed score to the total of a key, `(dimension, category, subcategory or 'total')`.
 
-        if not subcategory:
-            self.total_scores[dimension][category]['total'] = (
-                    self.total_scores[dimension][category].get('total', 0) + score)
+        Integer scores are added directly. Once a float score reaches a key, its total is summed exactly as a
+        fraction and rounded once, so that totals depend only on the scores and not on the order they are added
+        or removed in.
+        """
+        subcategory = key[2]
+        exact_sum = self._exact_sums.get(key)
+        if exact_sum is None and not isinstance(score, float):
+            subcategories[subcategory] = subcategories.get(subcategory, 0) + sign * score
+            return
+        if exact_sum is None:
+            exact_sum = self._exact_sums[key] = [0, Fraction(subcategories.get(subcategory, 0))]
+        if isinstance(score, float):
+            exact_sum[0] += sign
+        exact_sum[1] += sign * Fraction(score)
+        if exact_sum[0]:
+            subcategories[subcategory] = float(exact_sum[1])
         else:
-            if subcategory not in self.total_scores[dimension][category]:
-                self.total_scores[dimension][category][subcategory] = 0
-            self.total_scores[dimension][category][subcategory] += score
+            # The last float score was removed
+            del self._exact_sums[key]
+            subcategories[subcategory] = int(exact_sum[1])
 
     def process_option(self, question: Dict, *, is_correct: bool = True, option_index: Optional[int] = None,
                        or_option_value: Optional[str] = None):
@@ -67,37 +105,152 @@ class ProfilingTestScoring:
                 score = scoring.get('negative_score')
             self.process_score(dimension, category, subcategory, score)
 
+    def process_rows(self, rows: Tuple[ScoreRow, ...], *, is_correct: bool = True):
+        """Process the scoring for precompiled score rows of a question option."""
+        for dimension, category, subcategory, score, negative_score in rows:
+            self.process_score(dimension, category, subcategory, score if is_correct else negative_score)
+
+    def process_open_answers(self, answers: List[Dict]):
+        """Process the scoring for answers to open questions, rating them in one batch."""
+        for rows in self.open_rater.rate(answers):
+            self.process_rows(rows, is_correct=True)
+
     def fetch_question_by_id(self, question_id: int) -> Optional[Dict]:
         """Fetch a question by its ID."""
-        return next((q for q in self.questions if q['id'] == question_id), None)
+        instrumentation.count('fetch_question_by_id')
+        return self.question_bank.get_question(question_id)
+
+    def process_answer(self, answer: Dict):
+        """Process the scoring for a single answer."""
+        instrumentation.count('get_compiled_question')
+        question = self.question_bank.get_compiled(answer['question_id'])
+        if question is None:
+            raise ValueError(f'Question `{answer["question_id"]}` is not in the questions table.')
+        if question.question_type in ['multiple', 'single']:
+            selected_options = answer['answer'].get('selected')
+            if isinstance(selected_options, list):
+                for option_index in selected_options:
+                    self.process_rows(question.option_rows[option_index], is_correct=True)
+            elif isinstance(selected_options, int):
+                self.process_rows(question.option_rows[selected_options], is_correct=True)
+        elif question.question_type == 'open':
+            if self._pending_open_answers is not None:
+                self._pending_open_answers.append(answer)
+            else:
+                self.process_open_answers([answer])
+        elif question.question_type == 'list-matching':
+            for option_value, selected_index in answer['answer']['selected'].items():
+                rows, correct_value = question.matching.get(option_value, ((), None))
+                is_correct = correct_value is not None and question.options[selected_index] == correct_value
+                self.process_rows(rows, is_correct=is_correct)
 
     def calculate_scores_for_profiling_test(self) -> Dict:
         """Calculate the total scores for a profiling test."""
-        for answer in self.user_answers:
-            question = self.fetch_question_by_id(answer['question_id'])
-            if question['question_type'] in ['multiple', 'single']:
-                selected_options = answer['answer'].get('selected')
-                if isinstance(selected_options, list):
-                    for option_index in selected_options:
-                        self.process_option(question, is_correct=True, option_index=option_index)
-                elif isinstance(selected_options, int):
-                    option_index = selected_options
-                    self.process_option(question, is_correct=True, option_index=option_index)
-            elif question['question_type'] == 'open':
-                raise NotImplemented('Implement logic for `open` questions in `calculate_scores_for_profiling_test`')
-            elif question['question_type'] == 'list-matching':
-                correct_pairs = question['scoring_details'].get('correct_pairs', {})
-                for option_value, selected_index in answer['answer']['selected'].items():
-                    selected_value = question['answer_structure']['options'][selected_index]
-                    correct_value = correct_pairs.get(option_value)
-                    if correct_value is not None and selected_value == correct_value:
-                        self.process_option(question, is_correct=True, or_option_value=option_value)
-                    else:
-                        self.process_option(question, is_correct=False, or_option_value=option_value)
+        self._pending_open_answers = []
+        try:
+            for answer in self.user_answers:
+                self.process_answer(answer)
+            if self._pending_open_answers:
+                self.process_open_answers(self._pending_open_answers)
+        finally:
+            self._pending_open_answers = None
+        return self.total_scores
+
+
+class IncrementalProfilingTestScoring(ProfilingTestScoring):
+    """
+    A scorer that keeps the total scores up to date as single answers change.
+
+    Changing an answer subtracts the contributions of the previous answer to the same question and adds
+    the contributions of the new one, so an update costs O(options of the question). Totals are summed as by
+    `ProfilingTestScoring.add_to_total`, so that they always equal a full recompute over the current answers,
+    float scores included.
+
+    Attributes:
+        answers (Dict[int, Dict]): Current answers keyed by question ID.
+    """
+
+    def __init__(self, user_id: int, questions: List[Dict], question_bank: Optional[QuestionBank] = None,
+                 open_rater: Optional[OpenAnswerRater] = None):
+        """Initialize an IncrementalProfilingTestScoring object without answers."""
+        super().__init__(user_id, questions, [], question_bank, open_rater)
+        self.answers = {}
+        # (dimension, category, subcategory or 'total') -> number of scores added to the key
+        self._score_counts = {}
+        # (question ID, text) -> score rows added for a current open answer, subtracted as they were added
+        self._open_rows = {}
+        self._sign = 1
+
+    def process_score(self, dimension: str, category: Optional[str], subcategory: Optional[str], score: int):
+        """Add or, while removing an answer, subtract a score, dropping keys left without scores."""
+        instrumentation.count('process_score')
+        if not all([dimension, category, score]):
+            return
+
+        subcategory = subcategory or 'total'
+        key = (dimension, category, subcategory)
+        count = self._score_counts.get(key, 0) + self._sign
+        categories = self.total_scores.setdefault(dimension, {})
+        subcategories = categories.setdefault(category, {})
+        if count:
+            self._score_counts[key] = count
+            self.add_to_total(subcategories, key, score, self._sign)
+            return
+
+        del self._score_counts[key]
+        self._exact_sums.pop(key, None)
+        del subcategories[subcategory]
+        if not subcategories:
+            del categories[category]
+        if not categories:
+            del self.total_scores[dimension]
+
+    def process_open_answers(self, answers: List[Dict]):
+        """Rate and add open answers or, while removing an answer, subtract the rows added for them."""
+        if self._sign < 0:
+            for answer in answers:
+                key = (answer['question_id'], answer['answer'].get('selected'))
+                self.process_rows(self._open_rows.pop(key, ()), is_correct=True)
+            return
+        for answer, rows in zip(answers, self.open_rater.rate(answers)):
+            self._open_rows[(answer['question_id'], answer['answer'].get('selected'))] = rows
+            self.process_rows(rows, is_correct=True)
+
+    def remove_answer(self, question_id: int):
+        """Remove the answer to a question and subtract its scores."""
+        answer = self.answers.pop(question_id, None)
+        if answer is None:
+            return
+        self._sign = -1
+        try:
+            self.process_answer(answer)
+        finally:
+            self._sign = 1
+
+    def update_answer(self, answer: Dict) -> bool:
+        """Set the answer to a question, returns False if it was already set to the same selection."""
+        previous_answer = self.answers.get(answer['question_id'])
+        selected = answer['answer'].get('selected')
+        if previous_answer is not None and previous_answer['answer'].get('selected') == selected:
+            return False
+        self.process_answer(answer)
+        if previous_answer is not None:
+            self.remove_answer(answer['question_id'])
+        self.answers[answer['question_id']] = answer
+        return True
+
+    def calculate_scores_for_profiling_test(self) -> Dict:
+        """Return the total scores of the current answers."""
         return self.total_scores
 
 
-def adjust_subcategory_scores(data):
+def adjust_subcategory_scores(data: Dict) -> Dict:
+    """
+    Scale subcategory scores so that they add up to the total score of their category.
+
+    Returns a new dictionary, `data` is left unchanged.
+    """
+    adjusted_data = {}
     for dimension, categories in data.items():
         # Check if either all categories have the 'total' key or none of them have it
         total_keys_count = sum(1 for category, subcategories in categories.items() if 'total' in subcategories)
@@ -107,7 +260,9 @@ def adjust_subcategory_scores(data):
                  'Either all categories should have the \'total\' key or none of them should.'
                  f'Violating categories: \n{json.dumps(categories, indent=2)}'))
 
+        adjusted_categories = adjusted_data[dimension] = {}
         for category, subcategories in categories.items():
+            subcategories = adjusted_categories[category] = dict(subcategories)
             subcategories_sum = sum([score for subcat, score in subcategories.items() if subcat != 'total'])
             total = subcategories.get('total', subcategories_sum)
 
@@ -117,8 +272,6 @@ def adjust_subcategory_scores(data):
                 for subcategory, score in subcategories.items():
                     if subcategory != 'total':
                         subcategories[subcategory] = score * factor
-                    else:
-                        subcategories[subcategory] = score
 
                 subcategories['total'] = sum([score for subcat, score in subcategories.items() if subcat != 'total'])
             # If there's no subcategories, just distribute the total equally among them
@@ -133,4 +286,4 @@ def adjust_subcategory_scores(data):
                     subcategories['total'] = sum(
                         [score for subcat, score in subcategories.items() if subcat != 'total'])
 
-    return data
+    return adjusted_data
@@ -0,0 +1,165 @@
+"""
+This module contains a local HTTP endpoint for `scoring_service.ScoringService`, handling requests on a pool
+of worker threads.
+
+Usage:
+    python scoring_server.py [--host 127.0.0.1] [--port 8765] [--workers 4] [--questions-dir MCSCA_test/questions]
+
+Endpoints:
+    POST /score        An answer sheet, either `{"user_id": ..., "test_id": ..., "answers": [...]}` or a list of
+                       answers in the answers table format. Returns one result.
+    POST /score_batch  A list of answers of any number of users and tests. Returns one result per user and test.
+    GET  /health       Number of questions and result cache counters.
+
+Answers are validated against the question bank before scoring. Invalid requests get a 400 response with a JSON
+`error`, and `issues` listing the invalid answers.
+"""
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, Optional
+
+from compile_questions import validate_answers
+from scoring_service import ScoringService
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted by the endpoint, in bytes
+MAX_REQUEST_BYTES = 64 * 2 ** 20
+# Most validation issues reported in the body of a rejected request
+MAX_REPORTED_ISSUES = 20
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """Handles requests to the scoring endpoint, see the module documentation."""
+    server: 'ScoringHTTPServer'
+
+    def _send_json(self, status: HTTPStatus, content):
+        body = json.dumps(content, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f'Unknown path: `{self.path}`.'})
+            return
+        service = self.server.service
+        health = {'status': 'ok', 'questions': len(service.question_bank)}
+        if service.result_cache is not None:
+            health['result_cache'] = service.result_cache.stats()
+        self._send_json(HTTPStatus.OK, health)
+
+    def do_POST(self):
+        if self.path not in ('/score', '/score_batch'):
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': f'Unknown path: `{self.path}`.'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            {'error': f'Request body is larger than {MAX_REQUEST_BYTES} bytes.'})
+            return
+        try:
+            content = json.loads(self.rfile.read(length))
+            service = self.server.service
+            if self.path == '/score_batch' and not isinstance(content, list):
+                raise ValueError('Expected a list of answers.')
+            if isinstance(content, dict) and isinstance(content.get('answers'), list):
+                answers = content['answers']
+            elif isinstance(content, list):
+                answers = content
+            else:
+                raise ValueError('Expected a list of answers or an object with a list of `answers`.')
+            # Reject answers the scorer cannot handle, such as out of range options, before scoring them
+            issues = [issue for issue in validate_answers(service.question_bank, answers, self.path)
+                      if issue.severity == 'error']
+            if issues:
+                self._send_json(HTTPStatus.BAD_REQUEST, {
+                    'error': f'Invalid answers: {len(issues)} errors.',
+                    'issues': [{'question_id': issue.question_id, 'message': issue.message}
+                               for issue in issues[:MAX_REPORTED_ISSUES]],
+                })
+                return
+            if self.path == '/score_batch':
+                result = service.score_batch(answers)
+            elif answers is content:
+                result = service.score(answers)
+            else:
+                result = service.score(answers, content.get('user_id'), content.get('test_id'))
+        except (ValueError, KeyError, TypeError, NotImplementedError) as e:
+            # JSON decoding errors are ValueErrors
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': f'{type(e).__name__}: {e}'})
+            return
+        except Exception as e:
+            # Answer with an error rather than dropping the connection
+            logger.exception('Failed to score a request to %s', self.path)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': f'{type(e).__name__}: {e}'})
+            return
+        self._send_json(HTTPStatus.OK, result)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ScoringHTTPServer(HTTPServer):
+    """
+    HTTP server handling requests on a bounded pool of worker threads.
+
+    Attributes:
+        service (ScoringService): The service answering requests.
+        verbose (bool): Whether to log every request.
+    """
+
+    def __init__(self, server_address, service: ScoringService, workers: int = 4, verbose: bool = False):
+        """Bind the server and start its worker pool."""
+        super().__init__(server_address, ScoringRequestHandler)
+        self.service = service
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scoring-worker')
+
+    def _handle_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle_request, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Serve profiling test scoring over local HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker threads handling requests.')
+    parser.add_argument('--questions-dir', default=None,
+                        help='Folder with dimension folders of questions, defaults to the mock profiling test.')
+    parser.add_argument('--verbose', action='store_true', help='Log every request.')
+    args = parser.parse_args(argv)
+    service = ScoringService(questions_dir=args.questions_dir)
+    # Load the questions before accepting requests
+    print(f'Loaded {len(service.question_bank)} questions')
+    server = ScoringHTTPServer((args.host, args.port), service, workers=args.workers, verbose=args.verbose)
+    print(f'Serving on http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+This module contains the ScoringService class, headless scoring of answer sheets from memory or files.
+
+Importing this module has no side effects and does not import Streamlit, Plotly or NumPy: questions are loaded when
+the first answer sheet is scored. `scoring_server.py` serves it over local HTTP.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from compile_questions import load_question_bank
+from question_bank import QuestionBank, get_shared_question_bank
+from result_cache import ResultCache, get_result_cache
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from utils import iter_answers
+
+
+class ScoringService:
+    """
+    Scores answer sheets against a question bank.
+
+    Attributes:
+        questions_dir (str, optional): Folder with dimension folders of questions, used when no questions are given.
+            Defaults to the mock profiling test.
+        result_cache (ResultCache, optional): Cache of results by answer-set fingerprint, None to always score.
+    """
+
+    def __init__(self, questions: Optional[Sequence[Dict]] = None, questions_dir: Optional[str] = None,
+                 result_cache: Optional[ResultCache] = None, use_cache: bool = True):
+        """
+        Initialize the service, questions are loaded on first use.
+
+        Parameters:
+            questions (Sequence[Dict], optional): Questions to score against, instead of loading `questions_dir`.
+            questions_dir (str, optional): Folder with dimension folders of questions.
+            result_cache (ResultCache, optional): Cache of results, defaults to the process-wide cache.
+            use_cache (bool, optional): Whether to cache results. Defaults to True.
+        """
+        self.questions_dir = questions_dir
+        self.result_cache = (result_cache or get_result_cache()) if use_cache else None
+        self._questions = questions
+        self._question_bank = None
+        self._lock = threading.Lock()
+
+    @property
+    def question_bank(self) -> QuestionBank:
+        """The compiled question bank, loaded on first use."""
+        if self._question_bank is None:
+            with self._lock:
+                if self._question_bank is None:
+                    if self._questions is None:
+                        # From the compiled artifact of the folder when it is up to date
+                        self._question_bank = load_question_bank(self.questions_dir)
+                    else:
+                        self._question_bank = get_shared_question_bank(self._questions)
+        return self._question_bank
+
+    def score(self, answers: Iterable[Dict], user_id: Optional[int] = None, test_id: Optional[int] = None) -> Dict:
+        """
+        Score the answers of a single user's test.
+
+        Parameters:
+            answers (Iterable[Dict]): Answers in the answers table format.
+            user_id (int, optional): ID of the user, defaults to the user ID of the first answer.
+            test_id (int, optional): ID of the test, defaults to the test ID of the first answer.
+
+        Returns:
+            Dict: `user_id`, `test_id`, `result_scores` and `adjusted_scores`.
+        """
+        answers = list(answers)
+        if user_id is None:
+            user_id = answers[0]['user_id'] if answers else 0
+        if test_id is None:
+            test_id = answers[0].get('test_id', 0) if answers else 0
+        if self.result_cache is not None:
+            result_scores, adjusted_scores = self.result_cache.score(self.question_bank, answers, user_id)
+        else:
+            scorer = ProfilingTestScoring(user_id, self.question_bank.questions, answers, self.question_bank)
+            result_scores = scorer.calculate_scores_for_profiling_test()
+            adjusted_scores = adjust_subcategory_scores(result_scores)
+        return {'user_id': user_id, 'test_id': test_id, 'result_scores': result_scores,
+                'adjusted_scores': adjusted_scores}
+
+    def score_batch(self, answers_table: Iterable[Dict]) -> List[Dict]:
+        """Score answers of any number of users and tests, returning one result per user and test in order."""
+        grouped_answers = {}
+        for answer in answers_table:
+            grouped_answers.setdefault((answer['user_id'], answer.get('test_id', 0)), []).append(answer)
+        return [self.score(answers, user_id, test_id) for (user_id, test_id), answers in grouped_answers.items()]
+
+    def score_file(self, answers_fpath: str) -> List[Dict]:
+        """Score an answers file in JSON Lines or JSON array format, see `score_batch`."""
+        return self.score_batch(iter_answers(answers_fpath))
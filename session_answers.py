@@ -0,0 +1,171 @@
+"""
+This module contains the SessionAnswers class, the compact store of a questionnaire session's answers.
+
+Answers are kept in a single list indexed by question position in a shared `QuestionBank`, with a small
+encoding per question type:
+
+- `single`: the selected option index.
+- `multiple`: a bit mask of the selected option indices.
+- `list-matching`: one byte per option holding the selected option index + 1, 0 for options not matched yet.
+- `open`: the answer text.
+
+Unanswered questions hold None. Small option indices and masks are interned by Python, so most answers cost no
+more than their list slot.
+"""
+from array import array
+from typing import Dict, List, Optional, Union
+
+from question_bank import QuestionBank
+
+DEBUG_SCORING_DETAILS_KEY = 'scoring_details (FOR DEBUG ONLY)'
+
+Selected = Union[int, List[int], Dict[str, int], str]
+
+
+class SessionAnswers:
+    """
+    Answers of a single session, indexed by question position.
+
+    Answers to questions left out of the bank by `rebind`, e.g. by a filter, are kept aside and restored when the
+    answers are rebound to a bank holding those questions again.
+
+    Attributes:
+        question_bank (QuestionBank): Compiled questions the answers refer to, shared by all sessions.
+    """
+    __slots__ = ('question_bank', '_values', '_detached')
+
+    def __init__(self, question_bank: QuestionBank):
+        """Initialize a SessionAnswers object without answers."""
+        self.question_bank = question_bank
+        self._values: List[Optional[Union[int, bytes, array, str]]] = [None] * len(question_bank)
+        # Question ID -> selection of an answered question that is not in the bank
+        self._detached: Dict[int, Selected] = {}
+
+    def __len__(self) -> int:
+        return sum(value is not None for value in self._values)
+
+    def __contains__(self, question_id: int) -> bool:
+        position = self.question_bank.index.get(question_id)
+        return position is not None and self._values[position] is not None
+
+    def _position(self, question_id: int) -> int:
+        position = self.question_bank.index.get(question_id)
+        if position is None:
+            raise ValueError(f'Question `{question_id}` is not in the questions table.')
+        return position
+
+    def _encode(self, position: int, selected: Selected):
+        question = self.question_bank.compiled[position]
+        num_options = len(question.options)
+        if question.question_type == 'single':
+            if not isinstance(selected, int) or not 0 <= selected < num_options:
+                raise ValueError(f'Selected option `{selected}` of question `{question.id}` is out of range.')
+            return selected
+        if question.question_type == 'multiple':
+            mask = 0
+            for option_index in selected:
+                if not isinstance(option_index, int) or not 0 <= option_index < num_options:
+                    raise ValueError(f'Selected option `{option_index}` of question `{question.id}` is out of range.')
+                mask |= 1 << option_index
+            return mask
+        if question.question_type == 'list-matching':
+            codes = bytearray(num_options) if num_options < 255 else array('H', bytes(2 * num_options))
+            for option, option_index in selected.items():
+                if option not in question.options:
+                    raise ValueError(f'`{option}` is not an option of question `{question.id}`.')
+                if not isinstance(option_index, int) or not 0 <= option_index < num_options:
+                    raise ValueError(f'Selected option `{option_index}` for `{option}` of question `{question.id}` '
+                                     'is out of range.')
+                codes[question.options.index(option)] = option_index + 1
+            if not any(codes):
+                return None
+            return bytes(codes) if isinstance(codes, bytearray) else codes
+        if question.question_type == 'open':
+            if not isinstance(selected, str):
+                raise ValueError(f'Answer to open question `{question.id}` must be a text.')
+            return selected
+        raise ValueError(f'Illegal value for question type: `{question.question_type}`.')
+
+    def _decode(self, position: int) -> Optional[Selected]:
+        value = self._values[position]
+        if value is None:
+            return None
+        question = self.question_bank.compiled[position]
+        if question.question_type == 'multiple':
+            return [option_index for option_index in range(value.bit_length()) if value >> option_index & 1]
+        if question.question_type == 'list-matching':
+            return {question.options[option_position]: code - 1 for option_position, code in enumerate(value) if code}
+        return value
+
+    def get(self, question_id: int) -> Optional[Selected]:
+        """Get the selection of a question in the answers table format, None if it is not answered."""
+        return self._decode(self._position(question_id))
+
+    def set(self, question_id: int, selected: Optional[Selected]):
+        """Set the selection of a question in the answers table format, None to clear it."""
+        position = self._position(question_id)
+        self._values[position] = None if selected is None else self._encode(position, selected)
+
+    def _answer(self, position: int, user_id: int, test_id: int, with_scoring_details: bool) -> Optional[Dict]:
+        selected = self._decode(position)
+        if selected is None:
+            return None
+        question_id = self.question_bank.compiled[position].id
+        answer = {'selected': selected}
+        if with_scoring_details:
+            answer[DEBUG_SCORING_DETAILS_KEY] = self.question_bank.questions[position]['scoring_details']
+        return {'id': question_id, 'user_id': user_id, 'test_id': test_id, 'question_id': question_id,
+                'answer': answer}
+
+    def answer(self, question_id: int, user_id: int, test_id: int = 0,
+               with_scoring_details: bool = False) -> Optional[Dict]:
+        """
+        Build the answers table row of a single question, None if it is not answered.
+
+        Parameters:
+            question_id (int): ID of the question.
+            user_id (int): ID of the user taking the test.
+            test_id (int, optional): ID of the test. Defaults to 0.
+            with_scoring_details (bool, optional): Whether to embed the scoring details of the question for
+                debugging. Defaults to False.
+        """
+        return self._answer(self._position(question_id), user_id, test_id, with_scoring_details)
+
+    def answers_table(self, user_id: int, test_id: int = 0, with_scoring_details: bool = False) -> List[Dict]:
+        """Build the answers table rows of all answered questions in question order, see `answer`."""
+        return [self._answer(position, user_id, test_id, with_scoring_details)
+                for position, value in enumerate(self._values) if value is not None]
+
+    def rebind(self, question_bank: QuestionBank) -> 'SessionAnswers':
+        """
+        Move the answers to another question bank, such as a filtered table.
+
+        Answers to questions missing from the new bank are kept aside, and answers kept aside by a previous
+        rebind are restored if their questions are back.
+        """
+        session_answers = SessionAnswers(question_bank)
+        for question_id, selected in self._detached.items():
+            if question_id in question_bank.index:
+                try:
+                    session_answers.set(question_id, selected)
+                except ValueError:
+                    # The question changed and the answer does not fit it anymore
+                    continue
+            else:
+                session_answers._detached[question_id] = selected
+        for question_id, old_position in self.question_bank.index.items():
+            if self._values[old_position] is not None and question_id not in question_bank.index:
+                session_answers._detached[question_id] = self._decode(old_position)
+        for question_id, position in question_bank.index.items():
+            old_position = self.question_bank.index.get(question_id)
+            if old_position is None or self._values[old_position] is None:
+                continue
+            if question_bank.questions[position] is self.question_bank.questions[old_position]:
+                session_answers._values[position] = self._values[old_position]
+                continue
+            try:
+                session_answers.set(question_id, self._decode(old_position))
+            except ValueError:
+                # The question changed and the answer does not fit it anymore
+                continue
+        return session_answers
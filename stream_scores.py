@@ -0,0 +1,62 @@
+"""
+This module contains the streaming pipeline for scoring large answer exports.
+
+Answers are read one by one from JSON Lines or a top-level JSON array, contiguous rows of the same
+user and test are scored together, and results are written as JSON Lines as soon as they complete,
+so memory stays bounded regardless of the export size.
+
+Usage:
+    python stream_scores.py answers.jsonl results.jsonl [--questions-dir MCSCA_test/questions]
+"""
+import argparse
+import itertools
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from compile_questions import load_question_bank
+from question_bank import QuestionBank
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from utils import iter_answers
+
+
+def iter_answer_groups(answers: Iterable[Dict]) -> Iterator[Tuple[int, int, List[Dict]]]:
+    """Group contiguous answers by user ID and test ID."""
+    for (user_id, test_id), group in itertools.groupby(answers, key=lambda a: (a['user_id'], a.get('test_id'))):
+        yield user_id, test_id, list(group)
+
+
+def score_answer_groups(answers: Iterable[Dict], question_bank: QuestionBank) -> Iterator[Dict]:
+    """Score contiguous groups of answers, yielding one result per user and test."""
+    for user_id, test_id, user_answers in iter_answer_groups(answers):
+        scorer = ProfilingTestScoring(user_id=user_id, questions=question_bank.questions, user_answers=user_answers,
+                                      question_bank=question_bank)
+        result_scores = scorer.calculate_scores_for_profiling_test()
+        yield {'user_id': user_id, 'test_id': test_id, 'result_scores': result_scores,
+               'adjusted_scores': adjust_subcategory_scores(result_scores)}
+
+
+def stream_scores(input_fpath: str, output_fpath: str, questions_dir: Optional[str] = None) -> int:
+    """Score an answers file and write one JSON line of results per user and test, returns the number of lines."""
+    question_bank = load_question_bank(questions_dir)
+    num_results = 0
+    with open(output_fpath, 'w', encoding='utf-8') as fh:
+        for result in score_answer_groups(iter_answers(input_fpath), question_bank):
+            fh.write(json.dumps(result, ensure_ascii=False))
+            fh.write('\n')
+            num_results += 1
+    return num_results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Score answers exported as JSON Lines or a JSON array.')
+    parser.add_argument('input', help='Path to the answers file.')
+    parser.add_argument('output', help='Path to the JSON Lines file to write results to.')
+    parser.add_argument('--questions-dir', default=None,
+                        help='Folder with dimension folders of questions, defaults to the mock profiling test.')
+    args = parser.parse_args(argv)
+    num_results = stream_scores(args.input, args.output, args.questions_dir)
+    print(f'Scored {num_results} answer sheets into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import pytest
+
+from compile_questions import validate_answers
+from question_bank import QuestionBank
+from score import ProfilingTestScoring
+from test_session_answers import QUESTIONS
+
+
+@pytest.mark.parametrize('question_id', [1, 2])
+@pytest.mark.parametrize('answer', [{}, {'selected': None}, {'selected': []}])
+def test_missing_selection_is_valid_and_scored_as_none(question_id, answer):
+    question_bank = QuestionBank(QUESTIONS)
+    answers = [{'user_id': 1, 'question_id': question_id, 'answer': answer}]
+    assert validate_answers(question_bank, answers, 'answers.json') == []
+    assert ProfilingTestScoring(1, QUESTIONS, answers, question_bank).calculate_scores_for_profiling_test() == {}
+
+
+@pytest.mark.parametrize('selected', [2, -1, '0', [0, 5], [None]])
+def test_out_of_range_selection_is_reported(selected):
+    answers = [{'user_id': 1, 'question_id': 1, 'answer': {'selected': selected}}]
+    issues = validate_answers(QuestionBank(QUESTIONS), answers, 'answers.json')
+    assert [issue.question_id for issue in issues] == [1]
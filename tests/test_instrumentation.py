@@ -0,0 +1,33 @@
+import threading
+
+import instrumentation
+
+
+def test_concurrent_requests_are_profiled_one_at_a_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'CPROFILE_DIR', str(tmp_path))
+    first_started, second_finished = threading.Event(), threading.Event()
+    reports = {}
+
+    def request(name, wait_for=None, signal=None):
+        instrumentation.start_request(enabled=True)
+        if signal is not None:
+            signal.set()
+        if wait_for is not None:
+            wait_for.wait(10)
+        with instrumentation.stage('work'):
+            sum(range(1000))
+        reports[name] = instrumentation.finish_request()
+
+    first = threading.Thread(target=request, args=('first', second_finished, first_started))
+    first.start()
+    first_started.wait(10)
+    second = threading.Thread(target=request, args=('second',))
+    second.start()
+    second.join(10)
+    second_finished.set()
+    first.join(10)
+
+    assert 'cprofile' in reports['first'] and 'cprofile' not in reports['second']
+    assert [stage['stage'] for stage in reports['second']['stages']] == ['work', 'total']
+    request('third')
+    assert 'cprofile' in reports['third']
@@ -0,0 +1,18 @@
+import os
+import shutil
+
+from compile_questions import load_question_bank
+from manifest import load_lazy_questions
+from utils import get_questions_dir, question_files_signature
+
+
+def test_question_bank_versions_agree_between_loaders(tmp_path, monkeypatch):
+    questions_path = tmp_path / 'questions'
+    shutil.copytree(get_questions_dir(), questions_path)
+    monkeypatch.chdir(tmp_path)
+
+    lazy_questions = load_lazy_questions(str(questions_path))
+    assert question_files_signature('questions') == question_files_signature(questions_path)
+    assert load_lazy_questions('questions').version == lazy_questions.version
+    assert load_question_bank(os.path.relpath(questions_path)).version == lazy_questions.version
+    assert lazy_questions.filter(['single']).version != lazy_questions.version
@@ -0,0 +1,35 @@
+from persistence import AnswerStore
+
+
+def answer(user_id, question_id, selected, test_id=0):
+    return {'id': question_id, 'user_id': user_id, 'test_id': test_id, 'question_id': question_id,
+            'answer': {'selected': selected}}
+
+
+def test_resubmission_replaces_the_whole_answer_set(tmp_path):
+    store = AnswerStore(str(tmp_path / 'answers.sqlite3'))
+    try:
+        store.save_answers([answer(1, 8, 0), answer(1, 9, [0, 1])])
+        store.save_answers([answer(2, 8, 1)])
+        store.save_answers([answer(1, 9, [1])])
+        store.flush()
+        assert store.load_answers(user_id=1) == [answer(1, 9, [1])]
+        assert store.load_answers(user_id=2) == [answer(2, 8, 1)]
+
+        store.save_answers([], user_id=1, test_id=0)
+        store.flush()
+        assert store.load_answers(user_id=1) == []
+        assert store.load_answers(user_id=2) == [answer(2, 8, 1)]
+    finally:
+        store.close()
+
+
+def test_tests_of_a_user_are_kept_apart(tmp_path):
+    store = AnswerStore(str(tmp_path / 'answers.sqlite3'))
+    try:
+        store.save_answers([answer(1, 8, 0, test_id=0), answer(1, 8, 1, test_id=1)])
+        store.save_answers([answer(1, 9, 0, test_id=1)])
+        store.flush()
+        assert store.load_answers(user_id=1) == [answer(1, 8, 0, test_id=0), answer(1, 9, 0, test_id=1)]
+    finally:
+        store.close()
@@ -0,0 +1,45 @@
+import random
+
+from question_bank import QuestionBank
+from result_cache import ResultCache, fingerprint
+from score import ProfilingTestScoring, adjust_subcategory_scores
+from test_score import SCORES, make_questions, random_answer
+
+
+def test_fingerprint_ignores_answer_order_and_users():
+    rng = random.Random(0)
+    questions = make_questions(rng, SCORES)
+    question_bank = QuestionBank(questions)
+    answers = [random_answer(rng, question) for question in questions]
+    other_answers = [dict(answer, user_id=2, answer={'selected': answer['answer']['selected'][::-1]})
+                     if isinstance(answer['answer']['selected'], list) else dict(answer, user_id=2)
+                     for answer in reversed(answers)]
+    assert fingerprint(question_bank, answers) == fingerprint(question_bank, other_answers)
+
+    list_matching = {'question_id': 1, 'answer': {'selected': {'a': 1, 'b': 0}}}
+    reordered = {'question_id': 1, 'answer': {'selected': {'b': 0, 'a': 1}}}
+    assert fingerprint(question_bank, [list_matching]) == fingerprint(question_bank, [reordered])
+
+
+def test_fingerprint_depends_on_rater_and_selections():
+    rng = random.Random(0)
+    question_bank = QuestionBank(make_questions(rng, SCORES))
+    answers = [{'question_id': 1, 'answer': {'selected': 1}}]
+    key = fingerprint(question_bank, answers)
+    assert fingerprint(question_bank, answers, rater='custom_raters.Rater') != key
+    assert fingerprint(question_bank, [{'question_id': 1, 'answer': {'selected': '1'}}]) != key
+    assert fingerprint(question_bank, [{'question_id': 1, 'answer': {'selected': [1]}}]) != key
+    assert fingerprint(QuestionBank(make_questions(rng, SCORES)), answers) != key
+
+
+def test_cached_results_match_scoring():
+    rng = random.Random(1)
+    questions = make_questions(rng, SCORES)
+    question_bank = QuestionBank(questions)
+    cache = ResultCache(disk_path=None)
+    answers = [random_answer(rng, question) for question in questions]
+    result_scores = ProfilingTestScoring(1, questions, answers, question_bank).calculate_scores_for_profiling_test()
+    expected = (result_scores, adjust_subcategory_scores(result_scores))
+    assert cache.score(question_bank, answers) == expected
+    assert cache.score(question_bank, answers) == expected
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from question_bank import QuestionBank
+from score import IncrementalProfilingTestScoring, ProfilingTestScoring
+
+SCORES = [0.1, 0.2, 0.7, 1 / 3, 1e16, -1e16, 1, 2, 5]
+
+
+def make_questions(rng, scores, num_questions=30):
+    questions = []
+    for question_id in range(num_questions):
+        options = ['a', 'b', 'c']
+        scoring_details = {
+            option: [{'dimension': 'd', 'category': rng.choice('xy'), 'subcategory': rng.choice(['s', None]),
+                      'score': rng.choice(scores)} for _ in range(rng.randint(1, 2))]
+            for option in options
+        }
+        question_type = rng.choice(['single', 'multiple'])
+        questions.append({'id': question_id, 'question_type': question_type, 'answer_structure': {'options': options},
+                          'scoring_details': scoring_details})
+    return questions
+
+
+def random_answer(rng, question):
+    selected = rng.randrange(3) if question['question_type'] == 'single' else sorted(rng.sample(range(3), 2))
+    return {'id': question['id'], 'user_id': 1, 'question_id': question['id'], 'answer': {'selected': selected}}
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('scores', [SCORES, [1, 2, 3, -4]])
+def test_incremental_scores_match_a_full_recompute(seed, scores):
+    rng = random.Random(seed)
+    questions = make_questions(rng, scores)
+    question_bank = QuestionBank(questions)
+    scorer = IncrementalProfilingTestScoring(1, questions, question_bank)
+    answers = {}
+    for _ in range(600):
+        question = rng.choice(questions)
+        if rng.random() < 0.3:
+            scorer.remove_answer(question['id'])
+            answers.pop(question['id'], None)
+        else:
+            answer = answers[question['id']] = random_answer(rng, question)
+            scorer.update_answer(answer)
+        full_scores = ProfilingTestScoring(1, questions, list(answers.values()),
+                                           question_bank).calculate_scores_for_profiling_test()
+        assert scorer.calculate_scores_for_profiling_test() == full_scores
+        assert all(type(score) is type(full_scores[dimension][category][subcategory])
+                   for dimension, categories in scorer.total_scores.items()
+                   for category, subcategories in categories.items()
+                   for subcategory, score in subcategories.items())
+
+    for question_id in list(answers):
+        scorer.remove_answer(question_id)
+    assert scorer.calculate_scores_for_profiling_test() == {}
+
+
+def test_full_recompute_does_not_depend_on_answer_order():
+    rng = random.Random(0)
+    questions = make_questions(rng, SCORES)
+    answers = [random_answer(rng, question) for question in questions]
+    question_bank = QuestionBank(questions)
+    expected = ProfilingTestScoring(1, questions, answers, question_bank).calculate_scores_for_profiling_test()
+    for _ in range(5):
+        rng.shuffle(answers)
+        assert ProfilingTestScoring(1, questions, answers, question_bank).calculate_scores_for_profiling_test() == expected
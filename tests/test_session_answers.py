@@ -0,0 +1,41 @@
+from question_bank import QuestionBank
+from session_answers import SessionAnswers
+
+QUESTIONS = [
+    {'id': 1, 'question_type': 'single', 'answer_structure': {'options': ['a', 'b']},
+     'scoring_details': {'a': [{'dimension': 'd', 'category': 'x', 'score': 1}]}},
+    {'id': 2, 'question_type': 'multiple', 'answer_structure': {'options': ['a', 'b', 'c']},
+     'scoring_details': {'c': [{'dimension': 'e', 'category': 'y', 'score': 2}]}},
+    {'id': 3, 'question_type': 'list-matching', 'answer_structure': {'options': ['a', 'b']},
+     'scoring_details': {'correct_pairs': {'a': 'b'}}},
+    {'id': 4, 'question_type': 'open', 'answer_structure': {}, 'scoring_details': {}},
+]
+
+
+def test_rebind_keeps_answers_outside_a_filtered_bank():
+    full_bank = QuestionBank(QUESTIONS)
+    filtered_bank = QuestionBank([QUESTIONS[0]])
+    session_answers = SessionAnswers(full_bank)
+    session_answers.set(1, 1)
+    session_answers.set(2, [0, 2])
+    session_answers.set(3, {'a': 1})
+    session_answers.set(4, 'text')
+
+    filtered = session_answers.rebind(filtered_bank)
+    assert len(filtered) == 1
+    assert filtered.get(1) == 1
+    assert [answer['question_id'] for answer in filtered.answers_table(user_id=1)] == [1]
+
+    filtered.set(1, 0)
+    restored = filtered.rebind(QuestionBank(QUESTIONS))
+    assert len(restored) == 4
+    assert [restored.get(question_id) for question_id in [1, 2, 3, 4]] == [0, [0, 2], {'a': 1}, 'text']
+
+
+def test_rebind_drops_kept_answers_that_no_longer_fit():
+    session_answers = SessionAnswers(QuestionBank(QUESTIONS))
+    session_answers.set(2, [2])
+    filtered = session_answers.rebind(QuestionBank([QUESTIONS[0]]))
+    changed_question = dict(QUESTIONS[1], answer_structure={'options': ['a']})
+    restored = filtered.rebind(QuestionBank([QUESTIONS[0], changed_question]))
+    assert 2 not in restored
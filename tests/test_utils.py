@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from utils import iter_answers
+
+CHUNK_SIZES = [1, 2, 7, 64, 1 << 16]
+
+VALID_ARRAYS = [
+    '[]',
+    ' [ ] \n',
+    '[1]',
+    '[1, 2.5e3, -0.5, true, null, "a, b"]',
+    '[{"a": 1}, {"b": [1, 2]}]\n',
+    '[\n  {"id": 1, "answer": {"selected": {"x y": 3}}},\n  {"id": 2, "answer": {"selected": "tr \\"x\\" 1.5e-3"}}\n]',
+]
+
+MALFORMED_ARRAYS = [
+    '[1 2]',
+    '[{"a":1} {"b":2}]',
+    '[{"a":1}{"b":2}]',
+    '[1,,2]',
+    '[,1]',
+    '[1,]',
+    '[01]',
+    '[1]trailing',
+    '[1] ]',
+    '[{"a": x}]',
+    '[{"a": 1',
+    '[1, 2',
+]
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'answers.json'
+    path.write_text(text, encoding='utf-8')
+    return path
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('text', VALID_ARRAYS)
+def test_iter_answers_matches_json_loads(tmp_path, text, chunk_size):
+    assert list(iter_answers(write(tmp_path, text), chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('text', MALFORMED_ARRAYS)
+def test_iter_answers_rejects_malformed_arrays(tmp_path, text, chunk_size):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_answers(write(tmp_path, text), chunk_size))
+
+
+@pytest.mark.parametrize('text', ['[01]', '[{"a":1}{"b":2}]'])
+def test_iter_answers_rejects_adjacent_tokens_before_yielding(tmp_path, text):
+    answers = iter_answers(write(tmp_path, text), 64)
+    with pytest.raises(json.JSONDecodeError):
+        next(answers)
+
+
+def test_iter_answers_reads_json_lines(tmp_path):
+    text = '{"id": 1}\n\n{"id": 2}\n'
+    assert list(iter_answers(write(tmp_path, text))) == [{'id': 1}, {'id': 2}]
@@ -4,10 +4,11 @@ This module contains utility functions to load and manage profiling test data.
 
 import json
 import os
+import re
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional, TextIO, Tuple
 
-from config import MOCK_PROFTEST_DIR
+from config import EXPORT_FORMAT, MOCK_PROFTEST_DIR
 
 
 def fetch_answers_for_user(user_id: int, answers_table: List[Dict]) -> List[Dict]:
@@ -15,43 +16,156 @@ def fetch_answers_for_user(user_id: int, answers_table: List[Dict]) -> List[Dict
     return [answer for answer in answers_table if answer['user_id'] == user_id]
 
 
-def rate_open_question(text: str) -> Dict[str, int]:
-    """Rate an open question based on the text."""
-    # This is a mock implementation. Typically, this would use NLP or some heuristic to rate the answer.
-    if 'break problems' in text:
-        return {'analytical': 2}
-    return {}
+def get_questions_dir(questions_dir: Optional[str] = None) -> Path:
+    """Get the folder with dimension folders of questions, defaults to the mock profiling test."""
+    return Path(questions_dir if questions_dir is not None else f'{MOCK_PROFTEST_DIR}/questions')
 
 
-def load_and_merge_questions() -> List[Dict]:
+def list_question_files(questions_dir: Optional[str] = None) -> List[Path]:
+    """List existing question files of every dimension folder in the order they are merged."""
+    question_files = []
+    for dimension_folder in get_questions_dir(questions_dir).iterdir():
+        if dimension_folder.is_dir():
+            for file_name in ['category.json', 'subcategory.json']:
+                question_path = dimension_folder / file_name
+                if question_path.exists():
+                    question_files.append(question_path)
+    return question_files
+
+
+def load_and_merge_questions(questions_dir: Optional[str] = None) -> List[Dict]:
     """Load and merge questions from different dimensions."""
     merged_questions = []
-    dimensions_folder = Path(f'{MOCK_PROFTEST_DIR}/questions')
-    for dimension_folder in dimensions_folder.iterdir():
-        if dimension_folder.is_dir():
-            category_path = dimension_folder / 'category.json'
-            subcategory_path = dimension_folder / 'subcategory.json'
-            if category_path.exists():
-                with open(category_path, 'r', encoding='utf-8') as f:
-                    category_questions = json.load(f)
-                    merged_questions.extend(category_questions)
-            if subcategory_path.exists():
-                with open(subcategory_path, 'r', encoding='utf-8') as f:
-                    subcategory_questions = json.load(f)
-                    merged_questions.extend(subcategory_questions)
+    for question_path in list_question_files(questions_dir):
+        with open(question_path, 'r', encoding='utf-8') as f:
+            merged_questions.extend(json.load(f))
     return merged_questions
 
 
-def load_answers() -> List[Dict]:
+def question_files_signature(questions_dir: Optional[str] = None) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Signature of the question files of a folder, changing whenever a question file is added, removed or modified.
+
+    Holds the path relative to the folder in POSIX form, the modification time and the size of every question file,
+    in the order they are merged, so the same folder has the same signature whichever way it is referred to.
+    """
+    questions_path = get_questions_dir(questions_dir)
+    signature = []
+    for question_path in list_question_files(questions_path):
+        stat = question_path.stat()
+        signature.append((question_path.relative_to(questions_path).as_posix(), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def load_answers(answers_fpath: Optional[str] = None) -> List[Dict]:
     """Load answers from a JSON file."""
-    answers_fpath = Path('mock_prof_test/example_data/answers_table.json')
+    if answers_fpath is None:
+        answers_fpath = Path(f'{MOCK_PROFTEST_DIR}/example_data/answers_table.json')
     with open(answers_fpath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
-def export_results(questions_table, answers_table, result_scores, adjusted_scores=None):
-    """Export test data and results to JSON files."""
-    export_dir = os.path.join(MOCK_PROFTEST_DIR, 'example_data')
+# Text after a decode error that more data could still complete: a partial literal or number, or nothing
+_PARTIAL_TOKEN = re.compile(r'[\w.+-]*')
+
+
+def _is_truncated(error: json.JSONDecodeError) -> bool:
+    """Whether a decode error is due to the end of the buffer rather than to malformed JSON."""
+    return error.msg.startswith('Unterminated string') or _PARTIAL_TOKEN.fullmatch(error.doc, error.pos) is not None
+
+
+def _iter_json_array(fh: TextIO, buffer: str, chunk_size: int) -> Iterator[Dict]:
+    """
+    Incrementally decode the items of a top-level JSON array, `buffer` starts right after the `[`.
+
+    Items must be separated by exactly one comma and only whitespace may follow the closing `]`. Raises
+    `json.JSONDecodeError` as soon as the array is malformed, without reading the rest of the file.
+    """
+    decoder = json.JSONDecoder()
+    position = 0
+    eof = False
+    # `first`: an item or the closing `]`, `item`: an item after a comma, `separator`: a comma or the closing `]`
+    expecting = 'first'
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise json.JSONDecodeError('Unexpected end of file in a JSON array of answers', buffer, position)
+            buffer = fh.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+        if buffer[position] == ']' and expecting != 'item':
+            break
+        if expecting == 'separator':
+            if buffer[position] != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            position += 1
+            expecting = 'item'
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as e:
+            if eof or not _is_truncated(e):
+                raise
+            item, end = None, len(buffer)
+        # The item may continue in the next chunk, e.g. `1` of `1.5`
+        if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,]'
+                        and _PARTIAL_TOKEN.fullmatch(buffer, end) is not None):
+            chunk = fh.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if end < len(buffer) and buffer[end] not in ' \t\r\n,]':
+            # A token directly followed by another one, e.g. `01` or `{...}{...}`
+            raise json.JSONDecodeError("Expecting ',' delimiter", buffer, end)
+        yield item
+        position = end
+        expecting = 'separator'
+
+    # Only whitespace may follow the array
+    rest = buffer[position + 1:]
+    while True:
+        if rest and not rest.isspace():
+            raise json.JSONDecodeError('Extra data after a JSON array of answers', rest, len(rest) - len(rest.lstrip()))
+        rest = fh.read(chunk_size)
+        if not rest:
+            return
+
+
+def iter_answers(answers_fpath: str, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """
+    Stream answers from a file holding either JSON Lines or a single top-level JSON array.
+
+    Only the answer being decoded is kept in memory, regardless of the file size.
+    """
+    with open(answers_fpath, 'r', encoding='utf-8') as fh:
+        first_char = fh.read(1)
+        while first_char.isspace():
+            first_char = fh.read(1)
+        if first_char == '[':
+            yield from _iter_json_array(fh, '', chunk_size)
+            return
+        fh.seek(0)
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def export_results(questions_table, answers_table, result_scores, adjusted_scores=None, export_dir=None,
+                   export_format=EXPORT_FORMAT):
+    """Export test data and results to JSON files, or to a binary export with `export_format='binary'`."""
+    if export_dir is None:
+        export_dir = os.path.join(MOCK_PROFTEST_DIR, 'example_data')
+    if export_format == 'binary':
+        from binary_export import export_binary
+        export_binary(os.path.join(export_dir, 'binary'), questions_table, answers_table, result_scores,
+                      adjusted_scores)
+        return
+    if export_format != 'json':
+        raise ValueError(f'Illegal value for export format: `{export_format}`.')
     with open(os.path.join(export_dir, 'questions_table.json'), 'w', encoding='utf-8') as fh:
         fh.write(json.dumps(questions_table, ensure_ascii=False))
     with open(os.path.join(export_dir, 'answers_table.json'), 'w', encoding='utf-8') as fh:
@@ -61,3 +175,11 @@ def export_results(questions_table, answers_table, result_scores, adjusted_score
     if adjusted_scores:
         with open(os.path.join(export_dir, 'adjusted_scores.json'), 'w', encoding='utf-8') as fh:
             fh.write(json.dumps(adjusted_scores, ensure_ascii=False))
+
+
+def group_answers_by_user(answers_table: List[Dict]) -> Dict[int, List[Dict]]:
+    """Group answers by user ID, keeping users and their answers in the order of appearance."""
+    grouped_answers = {}
+    for answer in answers_table:
+        grouped_answers.setdefault(answer['user_id'], []).append(answer)
+    return grouped_answers
@@ -2,17 +2,121 @@
 This module contains the function to visualize test scores using Streamlit and Plotly.
 
 Functions:
-    visualize_adjusted_scores(result_scores: Dict, columns: int = 3, show_zero_scores: bool = True) -> None
+    visualize_adjusted_scores(result_scores: Dict, columns: int = 3, show_zero_scores: bool = True,
+                              cohort: Optional[CohortSummary] = None) -> None
 """
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
-import plotly.express as px
-import streamlit as st
+import plotly.graph_objects as go
 
-from mock_scores import collect_mock_results
-from score import adjust_subcategory_scores
+from cohort import CohortSummary
 
+# Process-wide cache shared by all sessions: content hash of the scores and `show_zero_scores` -> figures per
+# dimension, least recently used first
+_figures_cache: 'OrderedDict[str, List[Tuple[str, go.Figure]]]' = OrderedDict()
+_figures_cache_lock = threading.Lock()
+FIGURES_CACHE_SIZE = 256
 
-def visualize_adjusted_scores(result_scores, columns=3, show_zero_scores=True):
+
+def sunburst_spec(dimension: str, categories: Dict, show_zero_scores: bool = True) -> Tuple[List, List, List, List]:
+    """Build the ids, labels, parents and values of the sunburst chart of a dimension."""
+    ids, labels, parents, values = [dimension], [dimension], [''], []
+    root_value = sum([subcategories.get('total', 0) for _, subcategories in categories.items()])
+    values.append(root_value)
+
+    for category, subcategories in categories.items():
+        ids.append(f'{dimension}-{category}')
+        labels.append(category)
+        parents.append(dimension)
+        values.append(subcategories.get('total', 0))
+
+        for subcategory, score in subcategories.items():
+            if subcategory == 'total' or (score == 0 and not show_zero_scores):
+                continue
+            ids.append(f'{dimension}-{category}-{subcategory}')
+            labels.append(subcategory)
+            parents.append(f'{dimension}-{category}')
+            values.append(score)
+    return ids, labels, parents, values
+
+
+def _format_score(score: Optional[float]) -> str:
+    return 'n/a' if score is None else f'{score:.4g}'
+
+
+def sunburst_cohort_overlay(dimension: str, categories: Dict, cohort: CohortSummary,
+                            show_zero_scores: bool = True) -> Tuple[List[float], List[List[str]]]:
+    """
+    Build the colors and hover data of the sunburst chart of a dimension from a cohort summary.
+
+    Nodes are in the order of `sunburst_spec`. Colors are the user's percentile ranks in the cohort, 50 for nodes
+    the cohort has no statistics for. Hover data holds the percentile rank, the cohort median and the cohort
+    interquartile range.
+    """
+    colors, customdata = [50.0], [['n/a', 'n/a', 'n/a', 'n/a']]
+
+    def add_node(bucket, score):
+        rank = cohort.percentile_rank(bucket, score)
+        colors.append(50.0 if rank is None else rank)
+        customdata.append([_format_score(rank), _format_score(cohort.percentile(bucket, 50)),
+                           _format_score(cohort.percentile(bucket, 25)), _format_score(cohort.percentile(bucket, 75))])
+
+    for category, subcategories in categories.items():
+        add_node((dimension, category, None), subcategories.get('total', 0))
+        for subcategory, score in subcategories.items():
+            if subcategory == 'total' or (score == 0 and not show_zero_scores):
+                continue
+            add_node((dimension, category, subcategory), score)
+    return colors, customdata
+
+
+def build_sunburst_figures(result_scores: Dict, show_zero_scores: bool = True,
+                           cohort: Optional[CohortSummary] = None) -> List[Tuple[str, go.Figure]]:
+    """
+    Build a sunburst figure per dimension, colored by percentile ranks in a cohort if a summary is given.
+
+    Figures are cached by a content hash of the scores and the cohort summary, so unchanged results are not rebuilt.
+    The returned figures are shared and must not be modified.
+    """
+    content = json.dumps([result_scores, show_zero_scores, cohort.key if cohort is not None else None],
+                         ensure_ascii=False, default=str)
+    key = hashlib.sha1(content.encode('utf-8')).hexdigest()
+    with _figures_cache_lock:
+        figures = _figures_cache.get(key)
+        if figures is not None:
+            _figures_cache.move_to_end(key)
+            return figures
+
+    figures = []
+    for dimension, categories in result_scores.items():
+        ids, labels, parents, values = sunburst_spec(dimension, categories, show_zero_scores)
+        sunburst = go.Sunburst(ids=ids, labels=labels, parents=parents, values=values, branchvalues='total')
+        if cohort is not None:
+            colors, customdata = sunburst_cohort_overlay(dimension, categories, cohort, show_zero_scores)
+            sunburst.update(
+                marker={'colors': colors, 'colorscale': 'RdYlGn', 'cmin': 0, 'cmax': 100, 'showscale': True,
+                        'colorbar': {'title': 'Cohort percentile'}},
+                customdata=customdata,
+                hovertemplate=('<b>%{label}</b><br>Score: %{value}<br>Percentile rank: %{customdata[0]}<br>'
+                               'Cohort median: %{customdata[1]} (IQR %{customdata[2]} - %{customdata[3]})'
+                               '<extra></extra>'))
+        fig = go.Figure(sunburst)
+        fig.update_layout(title=f'{dimension}'.capitalize())
+        figures.append((dimension, fig))
+    # Figures are built outside the lock, a concurrent session building the same figures keeps the first ones
+    with _figures_cache_lock:
+        figures = _figures_cache.setdefault(key, figures)
+        _figures_cache.move_to_end(key)
+        if len(_figures_cache) > FIGURES_CACHE_SIZE:
+            _figures_cache.popitem(last=False)
+    return figures
+
+
+def visualize_adjusted_scores(result_scores, columns=3, show_zero_scores=True, cohort=None):
     """
     Visualize test scores using a sunburst chart.
 
@@ -20,42 +124,25 @@ def visualize_adjusted_scores(result_scores, columns=3, show_zero_scores=True):
         result_scores (Dict): A dictionary containing the test scores for different dimensions and categories.
         columns (int, optional): The number of columns for displaying the charts. Defaults to 3.
         show_zero_scores (bool, optional): Whether to show categories with zero scores. Defaults to True.
+        cohort (CohortSummary, optional): Summary of a cohort to compare the scores with. Defaults to None.
     """
+    # Imported here, so that figures can be built without Streamlit
+    import streamlit as st
+
     num_rows = -(-len(result_scores) // columns)
     col_pairs = [st.columns(columns) for _ in range(num_rows)]
     cols = [col for pair in col_pairs for col in pair]
 
-    for (col, (dimension, categories)) in zip(cols, result_scores.items()):
-        ids, labels, parents, values = [], [], [], []
-        ids.append(dimension)
-        labels.append(dimension)
-        parents.append('')
-        root_value = sum([subcategories.get('total', 0) for _, subcategories in categories.items()])
-        values.append(root_value)
-
-        for category, subcategories in categories.items():
-            ids.append(f'{dimension}-{category}')
-            labels.append(category)
-            parents.append(dimension)
-            total_value = subcategories.get('total', 0)
-            values.append(total_value)
-
-            for subcategory, score in subcategories.items():
-                if subcategory == 'total' or (score == 0 and not show_zero_scores):
-                    continue
-                ids.append(f'{dimension}-{category}-{subcategory}')
-                labels.append(subcategory)
-                parents.append(f'{dimension}-{category}')
-                values.append(score)
-
-        fig = px.sunburst(
-            names=labels, ids=ids, parents=parents, values=values,
-            title=f'{dimension}'.capitalize(), branchvalues='total'
-        )
+    for col, (dimension, fig) in zip(cols, build_sunburst_figures(result_scores, show_zero_scores, cohort)):
         col.plotly_chart(fig, use_container_width=True)
 
 
 if __name__ == '__main__':
+    import streamlit as st
+
+    from mock_scores import collect_mock_results
+    from score import adjust_subcategory_scores
+
     raw_test_results = collect_mock_results()
     adjusted_scores = adjust_subcategory_scores(raw_test_results)
     st.title('Profiling Test Results')